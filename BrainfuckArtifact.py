@@ -0,0 +1,265 @@
+import argparse, mmap, os, struct, sys, zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+import BrainfuckOptimizer
+from BrainfuckInterpreter import Compiled, Interpreter
+from BrainfuckOptimizer import Program
+
+# Compiled program artifact: everything Interpreter needs from a macrofuck
+# program (see Compiled) in one file that is used straight from a read-only
+# mmap, so loading it runs neither the compiler nor the optimizer.
+# Layout: the header, the section table (offset and length of every section)
+# and the sections, each one aligned to 8 bytes. Integer sections are native
+# arrays of "i" that become memoryviews of the mapping.
+# Header: magic, version, byte order (0 little, 1 big), size of an "i" item,
+# optimizer checksum, minimum memory size and number of sections
+HEADER = struct.Struct("<4sBBBxIQI")
+SECTION = struct.Struct("<QQ")
+MAGIC = b"BFCA"
+VERSION = 2
+
+
+# The lowered program is only valid for the optimizer that made it (OpType
+# numbering, Program.fold_offsets semantics...), so artifacts carry a
+# checksum of its source and other ones are rejected
+def optimizer_checksum() -> int:
+    with open(BrainfuckOptimizer.__file__, "rb") as f:
+        return zlib.crc32(f.read())
+
+
+OPTIMIZER = optimizer_checksum()
+SECTIONS = (
+    "source",  # Macrofuck program (utf-8)
+    "code",  # Brainfuck code (latin-1)
+    # Program lowered with the default options (optimized, no boundaries or
+    # breakpoints, bounds proven for the minimum memory size). The jump
+    # targets of the brackets are the args of Open and Close.
+    "types",
+    "args",
+    "starts",
+    "ends",
+    "offsets",
+    # Program.tables, one after the other: MulAdd tables as
+    # (number of targets, sign, low, high, offset, factor, ...), Scan tables as
+    # (-1, step, value), and where each one starts
+    "tables",
+    "table_starts",
+    # Macro names (utf-8, one after the other) and where each one starts (one more than names)
+    "names",
+    "name_starts",
+    # Macro span tables (the stack trace data): the sorted code positions,
+    # where the names of each one start in the names section (one more than
+    # positions) and the name numbers
+    "entry_positions",
+    "entry_bounds",
+    "entry_names",
+    "exit_positions",
+    "exit_bounds",
+    "exit_names",
+)
+
+
+# Read-only view of a macro span table of an artifact, used as the dict
+# (code position -> macro names) of the stack trace data. Positions are
+# found by bisection, so nothing is built when it is loaded.
+class MacroSpans(Mapping):
+    def __init__(self, positions, bounds, numbers, names: list[str]) -> None:
+        self.positions = positions
+        self.bounds = bounds
+        self.numbers = numbers
+        self.names = names
+
+    def __getitem__(self, position: int) -> list[str]:
+        index = bisect_left(self.positions, position)
+        if index == len(self.positions) or self.positions[index] != position:
+            raise KeyError(position)
+        return [
+            self.names[self.numbers[i]]
+            for i in range(self.bounds[index], self.bounds[index + 1])
+        ]
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+# Read-only view of the packed Program.tables of an artifact. A table is
+# only decoded the first time it is used (big programs have hundreds of
+# thousands of them), then kept.
+class PackedTables(Sequence):
+    def __init__(self, packed, starts) -> None:
+        self.packed = packed
+        self.starts = starts
+        self.tables = [None] * len(starts)
+
+    def __getitem__(self, index: int) -> tuple:
+        table = self.tables[index]
+        if table is None:
+            table = self.tables[index] = self.__decode(self.starts[index])
+        return table
+
+    def __decode(self, start: int) -> tuple:
+        packed = self.packed
+        count = packed[start]
+        if count < 0:
+            return (packed[start + 1], packed[start + 2])
+        end = start + 4 + 2 * count
+        targets = tuple(zip(packed[start + 4 : end : 2], packed[start + 5 : end : 2]))
+        return (targets, packed[start + 1], packed[start + 2], packed[start + 3])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+# Packs Program.tables into one array and gives where each table starts
+def pack_tables(tables: list[tuple]) -> tuple[array, array]:
+    packed, starts = array("i"), array("i")
+    for table in tables:
+        starts.append(len(packed))
+        if len(table) == 2:
+            packed.extend((-1, table[0], table[1]))
+        else:
+            targets, sign, low, high = table
+            packed.extend((len(targets), sign, low, high))
+            for offset, factor in targets:
+                packed.extend((offset, factor))
+    return packed, starts
+
+
+# Packs a span table (code position -> macro names) into its three arrays
+def pack_spans(spans: dict, numbers: dict[str, int]) -> tuple[array, array, array]:
+    positions, bounds, names = array("i"), array("i", [0]), array("i")
+    for position in sorted(spans):
+        positions.append(position)
+        for name in spans[position]:
+            names.append(numbers.setdefault(name, len(numbers)))
+        bounds.append(len(names))
+    return positions, bounds, names
+
+
+# Writes the artifact of a compiled program
+def save(compiled: Compiled, path: str) -> None:
+    program = compiled.program(set(), False, True, set())
+    numbers: dict[str, int] = dict()
+    entries, exits = compiled.stack_trace_data
+    spans = pack_spans(entries, numbers) + pack_spans(exits, numbers)
+    names = [name.encode("utf-8") for name in numbers]
+    name_starts = array("i", [0])
+    for name in names:
+        name_starts.append(name_starts[-1] + len(name))
+    tables, table_starts = pack_tables(program.tables)
+    sections = [
+        compiled.source.encode("utf-8"),
+        compiled.code.encode("latin-1"),
+        program.types.tobytes(),
+        program.args.tobytes(),
+        program.starts.tobytes(),
+        program.ends.tobytes(),
+        program.offsets.tobytes(),
+        tables.tobytes(),
+        table_starts.tobytes(),
+        b"".join(names),
+        name_starts.tobytes(),
+    ] + [table.tobytes() for table in spans]
+    position = HEADER.size + SECTION.size * len(sections)
+    directory = []
+    for data in sections:
+        position += -position % 8
+        directory.append(SECTION.pack(position, len(data)))
+        position += len(data)
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        0 if sys.byteorder == "little" else 1,
+        array("i").itemsize,
+        OPTIMIZER,
+        compiled.min_mem_size,
+        len(sections),
+    )
+    # Written aside and renamed, so readers never map half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(header + b"".join(directory))
+        for data in sections:
+            f.write(bytes(-f.tell() % 8))
+            f.write(data)
+    os.replace(temporary, path)
+
+
+# Maps an artifact written by save. The program arrays and the span tables
+# stay in the mapping; only the code and the macro names are copied out.
+def load(path: str) -> Compiled:
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise ValueError("The artifact is truncated.")
+    magic, version, order, itemsize, optimizer, min_mem_size, count = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION or count != len(SECTIONS):
+        raise ValueError("The file is not a compiled program artifact of this version.")
+    if order != (0 if sys.byteorder == "little" else 1) or itemsize != array("i").itemsize:
+        raise ValueError("The artifact was written on a machine with other integers.")
+    if optimizer != OPTIMIZER:
+        raise ValueError("The artifact was written by another version of the optimizer.")
+    sections = dict()
+    for index, name in enumerate(SECTIONS):
+        offset, length = SECTION.unpack_from(view, HEADER.size + SECTION.size * index)
+        if offset + length > len(view):
+            raise ValueError("The artifact is truncated.")
+        sections[name] = view[offset : offset + length]
+    integers = {name: sections[name].cast("i") for name in SECTIONS[3:] if name != "names"}
+    code = str(sections["code"], "latin-1")
+    program = Program("", optimize=False)
+    program.code = code
+    program.types = sections["types"]
+    program.args = integers["args"]
+    program.starts = integers["starts"]
+    program.ends = integers["ends"]
+    program.offsets = integers["offsets"]
+    program.tables = PackedTables(integers["tables"], integers["table_starts"])
+    name_starts = integers["name_starts"]
+    names = [
+        str(sections["names"][name_starts[i] : name_starts[i + 1]], "utf-8")
+        for i in range(len(name_starts) - 1)
+    ]
+    stack_trace_data = [
+        MacroSpans(
+            integers[f"{kind}_positions"],
+            integers[f"{kind}_bounds"],
+            integers[f"{kind}_names"],
+            names,
+        )
+        for kind in ("entry", "exit")
+    ]
+    compiled = Compiled(
+        str(sections["source"], "utf-8"), code, stack_trace_data, min_mem_size
+    )
+    compiled.programs[Compiled.key(set(), False, True, set())] = program
+    return compiled
+
+
+# Loads an artifact into Interpreter.cache and gives its macrofuck source,
+# so Interpreter(install(path)) starts without compiling
+def install(path: str) -> str:
+    compiled = load(path)
+    Interpreter.add_compiled(compiled)
+    return compiled.source
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compiles a Macrofuck (or Varfuck, .vk) program into an artifact."
+    )
+    parser.add_argument("program", help="Macrofuck or Varfuck (.vk) source file")
+    parser.add_argument("artifact", help="file to write")
+    arguments = parser.parse_args()
+    with open(arguments.program) as f:
+        source = f.read()
+    if arguments.program.endswith(".vk"):
+        import VarfuckTranspiler
+
+        source = VarfuckTranspiler.transpile(source)
+    save(Interpreter.compile(source), arguments.artifact)
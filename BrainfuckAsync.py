@@ -0,0 +1,82 @@
+import asyncio
+from BrainfuckInterpreter import Interpreter
+from BrainfuckIO import BufferSink, FeedSource
+
+
+# Runs an interpreter inside an asyncio event loop, so many interactive
+# programs can share one thread. The program runs in slices of
+# yield_every instructions and gives control back to the loop after each
+# slice, and while it waits for input.
+# reader: anything with "async read(n) -> bytes" (eg asyncio.StreamReader),
+# b"" meaning the end of the input. Without one the input is only what is
+# passed to Session.feed.
+# writer: anything with write(bytes) and "async drain()" (eg
+# asyncio.StreamWriter). Without one the output is returned by Session.run.
+class Session:
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        reader=None,
+        writer=None,
+        yield_every: int = 65536,
+        read_size: int = 4096,
+    ) -> None:
+        self.interpreter = interpreter
+        self.reader = reader
+        self.writer = writer
+        self.yield_every = yield_every
+        self.read_size = read_size
+        self.source = FeedSource()
+        self.sink = BufferSink()
+        self.fed = asyncio.Event()  # Set when Session.feed adds input
+
+    # Adds input for the program (without a reader)
+    def feed(self, data: bytes | str) -> None:
+        self.source.feed(data)
+        self.fed.set()
+
+    # Marks the end of the input (without a reader)
+    def close(self) -> None:
+        self.source.close()
+        self.fed.set()
+
+    # Passes the output printed so far to the writer
+    async def __flush(self) -> None:
+        if self.writer is not None and self.sink.data:
+            self.writer.write(bytes(self.sink.data))
+            self.sink.data.clear()
+            await self.writer.drain()
+
+    async def __wait_for_input(self) -> None:
+        if self.reader is None:
+            # Input may have been fed while the output was drained
+            while not self.source.ready():
+                self.fed.clear()
+                await self.fed.wait()
+            return
+        data = await self.reader.read(self.read_size)
+        if data:
+            self.source.feed(data)
+        else:
+            self.source.close()
+
+    # Runs the program until it finishes or stops on a breakpoint
+    # (the output is returned when there is no writer)
+    async def run(self) -> str | None:
+        interpreter = self.interpreter
+        while not interpreter.finished():
+            interpreter.run(
+                sink=self.sink, source=self.source, max_steps=self.yield_every
+            )
+            await self.__flush()
+            if interpreter.breakpoint is not None:
+                break
+            if interpreter.waiting:
+                await self.__wait_for_input()
+            else:
+                await asyncio.sleep(0)
+        await self.__flush()
+        if self.writer is None:
+            output = self.sink.getvalue().decode("latin-1")
+            self.sink.data.clear()
+            return output
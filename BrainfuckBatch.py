@@ -0,0 +1,180 @@
+import argparse, json, multiprocessing, sys, time
+from typing import Iterable, Iterator
+from BrainfuckInterpreter import Interpreter
+from BrainfuckIO import BufferSink, EOFPolicy
+
+
+# Outcome of one input of a batch
+class BatchResult:
+    def __init__(
+        self,
+        index: int,
+        output: str,
+        steps: int,
+        error: str = None,
+        seconds: float = 0.0,
+    ) -> None:
+        self.index = index  # Position of the input in the batch
+        self.output = output
+        self.steps = steps  # Instructions executed
+        self.error = error  # "ExceptionName: message" when the run failed
+        self.seconds = seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "output": self.output,
+            "steps": self.steps,
+            "error": self.error,
+            "seconds": round(self.seconds, 6),
+        }
+
+
+# Interpreter of the worker process (see start_worker)
+worker: Interpreter = None
+worker_prefix: bytes = None
+worker_max_steps: int = None
+
+
+def start_worker(
+    code: str, options: dict, prefix: bytes | None, max_steps: int | None
+) -> None:
+    global worker, worker_prefix, worker_max_steps
+    # Forked workers find the program already compiled in Interpreter.cache
+    worker = Interpreter(code, **options)
+    worker_prefix = prefix
+    worker_max_steps = max_steps
+
+
+# Runs one input on the worker interpreter
+def run_input(job: tuple[int, str | bytes]) -> BatchResult:
+    index, in_tape = job
+    start = time.perf_counter()
+    # Failed runs still report what they printed
+    sink = BufferSink()
+    error = None
+    try:
+        if worker_prefix is not None:
+            worker.load_prefix(worker_prefix)
+        else:
+            worker.reset()
+        # The steps of the prefix count against the budget
+        budget = None if worker_max_steps is None else worker_max_steps - worker.steps
+        worker.run(in_tape=in_tape, sink=sink, max_steps=budget)
+        if not worker.finished():
+            raise TimeoutError(f"The program did not finish in {worker_max_steps} steps.")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return BatchResult(
+        index,
+        sink.getvalue().decode("latin-1"),
+        worker.steps,
+        error,
+        time.perf_counter() - start,
+    )
+
+
+# Runs one compiled program over many inputs on a pool of processes. The
+# program is compiled (and lowered) once in this process: forked workers
+# share it copy-on-write through Interpreter.cache, other start methods
+# compile it again in every worker. Each worker keeps one interpreter and
+# resets it between inputs.
+# prefix: evaluates the input-independent prefix once (see Interpreter.evaluate_prefix)
+# and starts every input from it. A prefix that fails or does not stop
+# within max_steps is not used: every input then runs from the start.
+# max_steps: inputs that need more instructions fail (hot loops are not compiled when set)
+class Batch:
+    def __init__(
+        self,
+        code: str,
+        processes: int = None,
+        max_steps: int = None,
+        eof: EOFPolicy = EOFPolicy.Error,
+        tiered: bool = True,
+        prefix: bool = False,
+        chunk_size: int = 1,
+    ) -> None:
+        self.code = code
+        self.processes = processes
+        self.max_steps = max_steps
+        self.chunk_size = chunk_size
+        self.options = {"tiered": tiered, "eof": eof}
+        # Compiles and lowers the program before the pool forks
+        self.interpreter = Interpreter(code, **self.options)
+        self.prefix = self.__evaluate_prefix() if prefix else None
+
+    # Gives the prefix artifact (None if the prefix cannot be used)
+    def __evaluate_prefix(self) -> bytes | None:
+        interpreter = self.interpreter
+        try:
+            artifact = interpreter.evaluate_prefix(self.max_steps)
+        except Exception:
+            return None
+        # Stopped by the budget: every input would run out of it as well
+        if not interpreter.waiting and not interpreter.finished():
+            return None
+        return artifact
+
+    # Yields the result of every input, in input order or (ordered=False) as they finish
+    def run(
+        self, inputs: Iterable[str | bytes], ordered: bool = True
+    ) -> Iterator[BatchResult]:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with context.Pool(
+            self.processes,
+            start_worker,
+            (self.code, self.options, self.prefix, self.max_steps),
+        ) as pool:
+            mapper = pool.imap if ordered else pool.imap_unordered
+            yield from mapper(run_input, enumerate(inputs), self.chunk_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs a Macrofuck (or Varfuck, .vk) program over many inputs."
+    )
+    parser.add_argument("program", help="Macrofuck or Varfuck (.vk) source file")
+    parser.add_argument("inputs", nargs="*", help="files that each hold one input")
+    parser.add_argument(
+        "--jsonl", help="file with one input per line as a JSON string (- for stdin)"
+    )
+    parser.add_argument("--processes", type=int, help="worker processes (all cores by default)")
+    parser.add_argument("--max-steps", type=int, help="instruction budget of each input")
+    parser.add_argument(
+        "--eof", choices=[policy.name for policy in EOFPolicy], default="Error"
+    )
+    parser.add_argument(
+        "--prefix", action="store_true", help="evaluate the input-independent prefix once"
+    )
+    parser.add_argument(
+        "--unordered", action="store_true", help="print results as they finish"
+    )
+    parser.add_argument("--chunk-size", type=int, default=1)
+    arguments = parser.parse_args()
+    with open(arguments.program) as f:
+        code = f.read()
+    if arguments.program.endswith(".vk"):
+        import VarfuckTranspiler
+
+        code = VarfuckTranspiler.transpile(code)
+    inputs = []
+    for path in arguments.inputs:
+        with open(path, "rb") as f:
+            inputs.append(f.read())
+    if arguments.jsonl:
+        lines = sys.stdin if arguments.jsonl == "-" else open(arguments.jsonl)
+        inputs += [json.loads(line) for line in lines if line.strip()]
+    batch = Batch(
+        code,
+        arguments.processes,
+        arguments.max_steps,
+        EOFPolicy[arguments.eof],
+        prefix=arguments.prefix,
+        chunk_size=arguments.chunk_size,
+    )
+    failed = False
+    for result in batch.run(inputs, not arguments.unordered):
+        failed = failed or result.error is not None
+        print(json.dumps(result.to_dict()), flush=True)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,263 @@
+from BrainfuckOptimizer import OpType, Program
+
+
+# Function that is being generated
+class Function:
+    def __init__(self, close: int, parent: "Function" = None) -> None:
+        self.close = close  # ip of the bracket that ends it (-1 for the main function)
+        self.parent = parent
+        self.lines: list[str] = []
+        self.parts: list[str] = []  # Calls of the parts cut from the start of the function
+        self.indent = 1
+        self.depth = 0  # Loops currently open inside of the function
+        self.headers: list[int] = []  # Line of the header of every open loop
+
+
+# Translates an optimized Program into the source of a Python module.
+# The module defines run(m, p, o, r) -> p, where m is the tape, p the
+# pointer, o receives every output byte and r(current cell) returns the next
+# input byte.
+# Loops become while statements and pointer movement inside a block is
+# folded into the index expressions.
+# Big loop bodies (and deeply nested ones, Python limits the number of
+# statically nested blocks) are moved into their own functions, and long
+# functions are cut into parts that the function calls one after the other
+# (calling each part from the next one would nest a call per part). Since
+# the code comes from macro expansion, most of those functions are identical
+# and are only generated once.
+# With count, the functions also count the instructions they execute like
+# Interpreter.run does: run(m, p, o, r, s) -> (p, s), where s is the count.
+class Generator:
+    max_depth = 15
+    hoist_size = 64
+    part_size = 256
+
+    def __init__(self, program: Program, size: int, count: bool = False) -> None:
+        self.program = program
+        self.size = size
+        self.count = count
+        self.steps = 0  # Instructions not counted yet (count)
+        self.names: dict[str, str] = dict()  # Function body -> function name
+        self.sources: list[str] = []
+        self.function: Function = None
+        self.offset = 0
+        self.segment: list = []
+
+    # Index expression of the cell at offset from the pointer
+    @staticmethod
+    def cell(offset: int) -> str:
+        if offset > 0:
+            return f"m[p+{offset}]"
+        elif offset < 0:
+            return f"m[p-{-offset}]"
+        return "m[p]"
+
+    def emit(self, line: str) -> None:
+        self.function.lines.append(" " * self.function.indent + line)
+
+    # Bounds of the pointer are checked once per straight-line segment
+    def start_segment(self) -> None:
+        lines = self.function.lines
+        self.segment = [
+            lines,
+            len(lines),
+            self.function.indent,
+            self.offset,
+            self.offset,
+        ]
+        lines.append("")
+
+    def end_segment(self) -> None:
+        lines, index, indent, low, high = self.segment
+        conditions = []
+        if low < 0:
+            conditions.append(f"p<{-low}")
+        if high > 0:
+            conditions.append(f"p>={self.size - high}")
+        if conditions:
+            lines[index] = (
+                " " * indent + f"if {' or '.join(conditions)}:raise MemoryError(E)"
+            )
+
+    # Proven movement (Shift) needs no bounds check
+    def move(self, offset: int, proven: bool = False) -> None:
+        self.offset += offset
+        if not proven:
+            self.segment[3] = min(self.segment[3], self.offset)
+            self.segment[4] = max(self.segment[4], self.offset)
+
+    # Applies the pending pointer movement
+    def flush(self) -> None:
+        if self.offset:
+            self.emit(
+                f"p+={self.offset}" if self.offset > 0 else f"p-={-self.offset}"
+            )
+            self.offset = 0
+
+    # Counts the instructions executed since the last count
+    def count_steps(self) -> None:
+        if self.count and self.steps:
+            self.emit(f"s+={self.steps}")
+            self.steps = 0
+
+    # Call of a generated function
+    def call(self, name: str) -> str:
+        return f"p,s={name}(m,p,o,r,s)" if self.count else f"p={name}(m,p,o,r)"
+
+    # The offset of the instruction comes on top of the pending movement (see Program.fold_offsets)
+    def add(self, amount: int, offset: int = 0) -> None:
+        cell = Generator.cell(self.offset + offset)
+        self.emit(f"{cell}=({cell}+{amount})&255")
+
+    def mul_add(self, table: tuple, shift: int = 0) -> None:
+        targets, sign, low, high = table
+        self.offset += shift
+        cell = Generator.cell(self.offset)
+        self.emit(f"if {cell}:")
+        self.function.indent += 1
+        conditions = []
+        if self.offset + low < 0:
+            conditions.append(f"p<{-(self.offset + low)}")
+        if self.offset + high > 0:
+            conditions.append(f"p>={self.size - self.offset - high}")
+        if conditions:
+            self.emit(f"if {' or '.join(conditions)}:raise MemoryError(E)")
+        # A single target reads the cell itself
+        value = cell if sign == 1 else f"-{cell}"
+        if len(targets) > 1:
+            self.emit(f"v={value}")
+            value = "v"
+        for offset, factor in targets:
+            target = Generator.cell(self.offset + offset)
+            product = value if factor == 1 else f"{value}*{factor}"
+            self.emit(f"{target}=({target}+{product})&255")
+        self.emit(f"{cell}=0")
+        self.function.indent -= 1
+        self.offset -= shift
+
+    def scan(self, table: tuple) -> None:
+        step, value = table
+        if step == 1:
+            self.emit(f"p=m.find({value},p)")
+            self.emit("if p<0:raise MemoryError(E)")
+        elif step == -1:
+            self.emit(f"p=m.rfind({value},0,p+1)")
+            self.emit("if p<0:raise MemoryError(E)")
+        else:
+            self.emit(f"while m[p]!={value}:")
+            self.function.indent += 1
+            self.emit(f"p+={step}" if step > 0 else f"p-={-step}")
+            self.emit(f"if p<0 or p>={self.size}:raise MemoryError(E)")
+            self.function.indent -= 1
+
+    # Gives the name of a function with the given body (generating it if needed)
+    def define(self, lines: list[str]) -> str:
+        body = "\n".join(line for line in lines if line)
+        if body not in self.names:
+            name = f"f{len(self.names)}"
+            self.names[body] = name
+            if self.count:
+                self.sources.append(f"def {name}(m,p,o,r,s):\n{body}\n return p,s")
+            else:
+                self.sources.append(f"def {name}(m,p,o,r):\n{body}\n return p")
+        return self.names[body]
+
+    def open_loop(self, ip: int) -> None:
+        close = self.program.args[ip]
+        self.flush()
+        self.end_segment()
+        # "[" runs once, the body and "]" once per iteration
+        self.count_steps()
+        function = self.function
+        if not function.depth and len(function.lines) > Generator.part_size:
+            function.parts.append(" " + self.call(self.define(function.lines)))
+            function.lines[:] = []
+        if function.depth == Generator.max_depth or close - ip > Generator.hoist_size:
+            self.emit("while m[p]:")
+            # Filled in when the body is closed
+            self.emit("")
+            self.function = Function(close, function)
+        else:
+            function.headers.append(len(function.lines))
+            self.emit("while m[p]:")
+            function.indent += 1
+            function.depth += 1
+        self.start_segment()
+
+    def close_loop(self, ip: int) -> None:
+        self.flush()
+        self.end_segment()
+        self.count_steps()
+        function = self.function
+        if function.close == ip:
+            name = self.define(function.parts + function.lines)
+            self.function = function.parent
+            self.function.lines[-1] = (
+                " " * (self.function.indent + 1) + self.call(name)
+            )
+        else:
+            header = function.headers.pop()
+            if len(function.lines) == header + 2 and not function.lines[-1]:
+                self.emit("pass")
+            function.indent -= 1
+            function.depth -= 1
+        self.start_segment()
+
+    # Generates the module source for the instructions in [start, end)
+    def generate(self, start: int = 0, end: int = None) -> str:
+        types = self.program.types
+        args = self.program.args
+        tables = self.program.tables
+        self.names = dict()
+        self.sources = []
+        self.function = Function(-1)
+        self.offset = 0
+        self.steps = 0
+        self.start_segment()
+        for ip in range(start, len(types) if end is None else end):
+            type = types[ip]
+            if type != OpType.Break:
+                self.steps += 1
+            if type == OpType.Add:
+                self.add(args[ip])
+            elif type == OpType.AddAt:
+                self.add(args[ip], self.program.offsets[ip])
+            elif type == OpType.Move:
+                self.move(args[ip])
+            elif type == OpType.Shift:
+                self.move(args[ip], True)
+            elif type == OpType.Clear:
+                self.emit(f"{Generator.cell(self.offset)}=0")
+            elif type == OpType.ClearAt:
+                self.emit(f"{Generator.cell(self.offset + self.program.offsets[ip])}=0")
+            elif type == OpType.MulAdd:
+                self.mul_add(tables[args[ip]], self.program.offsets[ip])
+            elif type == OpType.Output:
+                self.end_segment()
+                self.emit(f"o({Generator.cell(self.offset)})")
+                self.start_segment()
+            elif type == OpType.Input:
+                self.end_segment()
+                cell = Generator.cell(self.offset)
+                self.emit(f"{cell}=r({cell})")
+                self.start_segment()
+            elif type == OpType.Scan:
+                self.flush()
+                self.end_segment()
+                self.scan(tables[args[ip]])
+                self.start_segment()
+            elif type == OpType.Open:
+                self.open_loop(ip)
+            elif type == OpType.Close:
+                self.close_loop(ip)
+        self.flush()
+        self.end_segment()
+        self.count_steps()
+        self.sources.append(
+            f"run={self.define(self.function.parts + self.function.lines)}"
+        )
+        return "\n".join(self.sources)
+
+    # Compiles the generated module
+    def build(self, start: int = 0, end: int = None) -> object:
+        return compile(self.generate(start, end), "<brainfuck>", "exec")
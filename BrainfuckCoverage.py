@@ -0,0 +1,136 @@
+from BrainfuckInterpreter import Interpreter
+from BrainfuckOptimizer import OpType
+from BrainfuckProfiler import macro_paths
+
+
+# Instruction coverage of a group of instructions (a macro, a macro path or a Varfuck line)
+class CoverageEntry:
+    def __init__(self) -> None:
+        self.instructions = 0
+        self.covered = 0  # Instructions executed at least once
+        self.executions = 0
+
+    def add(self, count: int) -> None:
+        self.instructions += 1
+        self.covered += count > 0
+        self.executions += count
+
+    def __str__(self) -> str:
+        return f"{self.covered}/{self.instructions}\t{self.executions}"
+
+
+# Coverage and loop histograms of an interpreter created in profile mode.
+# Everything is keyed by names (macro names, macro paths, Varfuck lines and
+# the order of a loop inside its macro path), never by code positions, so
+# the dumps of two builds can be compared with diff. Macro paths leave the
+# Varfuck statements out.
+# Varfuck lines are known when the program was transpiled with its source
+# (VarfuckTranspiler.Processor(tree, source)), which names every statement
+# "vk:<line>" in the stack trace data.
+class Coverage:
+    def __init__(self, interpreter: Interpreter) -> None:
+        if interpreter.counts is None:
+            raise ValueError("The interpreter has to be created with profile=True.")
+        self.interpreter = interpreter
+        self.program = None  # Program the paths belong to
+        self.paths = None
+
+    # Macro path of every instruction, found again whenever the interpreter
+    # lowers its code again (breakpoints)
+    def __paths(self) -> list[tuple[str, ...]]:
+        program = self.interpreter.program
+        if program is not self.program:
+            self.paths = macro_paths(program, self.interpreter.stack_trace_data)
+            self.program = program
+        return self.paths
+
+    # Splits a path into its macros and the Varfuck line of the innermost statement
+    @staticmethod
+    def split_path(path: tuple[str, ...]) -> tuple[tuple[str, ...], int | None]:
+        macros = tuple(name for name in path if not name.startswith("vk:"))
+        lines = [name for name in path if name.startswith("vk:")]
+        return macros, int(lines[-1][3:]) if lines else None
+
+    # Instructions that belong to the program itself (not breakpoints)
+    def __instructions(self):
+        program = self.interpreter.program
+        counts = self.interpreter.counts
+        paths = self.__paths()
+        for pc in range(len(program)):
+            if program.types[pc] != OpType.Break:
+                yield pc, counts[pc], Coverage.split_path(paths[pc])
+
+    # Coverage by innermost macro name
+    def macros(self) -> dict[str, CoverageEntry]:
+        result: dict[str, CoverageEntry] = dict()
+        for _, count, (macros, _) in self.__instructions():
+            result.setdefault(macros[-1], CoverageEntry()).add(count)
+        return result
+
+    # Coverage by macro path
+    def macro_paths(self) -> dict[tuple[str, ...], CoverageEntry]:
+        result: dict[tuple[str, ...], CoverageEntry] = dict()
+        for _, count, (macros, _) in self.__instructions():
+            result.setdefault(macros, CoverageEntry()).add(count)
+        return result
+
+    # Coverage by Varfuck line
+    def lines(self) -> dict[int, CoverageEntry]:
+        result: dict[int, CoverageEntry] = dict()
+        for _, count, (_, line) in self.__instructions():
+            if line is not None:
+                result.setdefault(line, CoverageEntry()).add(count)
+        return result
+
+    # Every loop as (macro path, order inside the path, Varfuck line, entries, iterations, histogram).
+    # histogram[i] is the number of times the loop ran 0 (i = 0) or 2^(i-1) to 2^i - 1 iterations.
+    def loops(self) -> list[tuple[tuple[str, ...], int, int | None, int, int, list[int]]]:
+        program = self.interpreter.program
+        counts = self.interpreter.counts
+        histograms = self.interpreter.loop_histograms
+        paths = self.__paths()
+        order: dict[tuple[str, ...], int] = dict()
+        result = []
+        for pc in range(len(program)):
+            if program.types[pc] != OpType.Open:
+                continue
+            path, line = Coverage.split_path(paths[pc])
+            index = order.get(path, 0)
+            order[path] = index + 1
+            histogram = list(histograms.get(pc, ()))
+            while histogram and not histogram[-1]:
+                histogram.pop()
+            result.append(
+                (path, index, line, counts[pc], counts[program.args[pc]], histogram)
+            )
+        return result
+
+    @staticmethod
+    def bucket(index: int) -> str:
+        if index < 2:
+            return str(index)
+        return f"{1 << (index - 1)}-{(1 << index) - 1}"
+
+    # Diffable text dump: one tab separated record per line, sorted inside every section
+    def dump(self) -> str:
+        lines = []
+        for name, entry in sorted(self.macros().items()):
+            lines.append(f"macro\t{name}\t{entry}")
+        for path, entry in sorted(self.macro_paths().items()):
+            lines.append(f"path\t{' > '.join(path)}\t{entry}")
+        for line, entry in sorted(self.lines().items()):
+            lines.append(f"line\t{line}\t{entry}")
+        for path, index, line, entries, iterations, histogram in sorted(self.loops()):
+            buckets = ",".join(
+                f"{Coverage.bucket(i)}:{count}"
+                for i, count in enumerate(histogram)
+                if count
+            )
+            lines.append(
+                f"loop\t{' > '.join(path)}#{index}\t{line or '-'}\t{entries}\t{iterations}\t{buckets}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.dump())
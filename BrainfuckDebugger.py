@@ -0,0 +1,172 @@
+from bisect import bisect_left, bisect_right
+from typing import Callable
+from BrainfuckInterpreter import Interpreter
+from BrainfuckOptimizer import OpType
+from BrainfuckIO import Sink, NullSink, Source, BytesSource, RecordingSource
+
+
+# State saved while recording
+class Checkpoint:
+    def __init__(self, step: int, data: bytes) -> None:
+        self.step = step
+        self.data = data
+
+
+# Time-travel debugger. Recording runs the program normally (in slices of
+# interval instructions) and saves a snapshot after every slice, together
+# with all the input consumed. Any earlier step is reached by restoring the
+# nearest checkpoint and replaying from it. When there are more than
+# max_checkpoints, every other one is dropped and the interval doubles, so
+# the memory used stays bounded.
+# The input positions saved in the checkpoints count the recorded input.
+# Checkpoints are snapshots, which save code positions, so they stay valid
+# when breakpoints lower the code again. Step numbers keep counting the
+# instructions of the program that was running when they were recorded.
+class Debugger:
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        in_tape: str | bytes = "",
+        source: Source = None,
+        sink: Sink = None,
+        interval: int = 16384,
+        max_checkpoints: int = 256,
+    ) -> None:
+        self.interpreter = interpreter
+        self.source = RecordingSource(
+            source if source is not None else BytesSource(in_tape)
+        )
+        self.sink = sink if sink is not None else NullSink()
+        self.interval = interval
+        self.max_checkpoints = max_checkpoints
+        interpreter.in_tape_pos = 0
+        self.checkpoints = [Checkpoint(interpreter.steps, interpreter.snapshot())]
+        self.frontier = interpreter.steps  # Furthest step recorded
+
+    def __checkpoint(self) -> None:
+        self.checkpoints.append(
+            Checkpoint(self.interpreter.steps, self.interpreter.snapshot())
+        )
+        if len(self.checkpoints) > self.max_checkpoints:
+            self.checkpoints = self.checkpoints[::2]
+            self.interval *= 2
+
+    # Source that gives back the recorded input from the current position
+    def __replay_source(self) -> Source:
+        return BytesSource(bytes(self.source.data), self.interpreter.in_tape_pos)
+
+    # Runs the program forward from the furthest recorded step (stops on breakpoints)
+    def record(self, max_steps: int = None) -> None:
+        interpreter = self.interpreter
+        if interpreter.steps != self.frontier:
+            self.goto(self.frontier)
+        end = None if max_steps is None else self.frontier + max_steps
+        try:
+            while not interpreter.finished():
+                budget = self.interval - (interpreter.steps - self.checkpoints[-1].step)
+                if end is not None:
+                    budget = min(budget, end - interpreter.steps)
+                interpreter.run(sink=self.sink, source=self.source, max_steps=budget)
+                if interpreter.steps - self.checkpoints[-1].step >= self.interval:
+                    self.__checkpoint()
+                if (
+                    interpreter.waiting
+                    or interpreter.breakpoint is not None
+                    or (end is not None and interpreter.steps >= end)
+                ):
+                    break
+        finally:
+            self.frontier = interpreter.steps
+
+    # Moves to the state right before the given step is executed
+    def goto(self, step: int) -> None:
+        interpreter = self.interpreter
+        if step < self.checkpoints[0].step:
+            raise ValueError(f"Step {step} is before the start of the recording.")
+        if step > self.frontier:
+            self.record(step - self.frontier)
+            return
+        checkpoint = self.checkpoints[
+            bisect_right([checkpoint.step for checkpoint in self.checkpoints], step) - 1
+        ]
+        # Replaying from the current state is shorter if it lies in between
+        if not checkpoint.step <= interpreter.steps <= step:
+            interpreter.restore(checkpoint.data)
+        source = self.__replay_source()
+        # Breakpoints may stop the replay on the way (and a program lowered
+        # again since the recording may count fewer steps to the end)
+        while interpreter.steps < step and not interpreter.finished():
+            interpreter.run(
+                sink=NullSink(), source=source, max_steps=step - interpreter.steps
+            )
+
+    def step_back(self) -> None:
+        self.goto(self.interpreter.steps - 1)
+
+    # Moves to the last step before the current one where condition holds
+    # (checked right before each instruction). Returns that step or None,
+    # in which case the state does not change.
+    def reverse_until(self, condition: Callable[[Interpreter], bool]) -> int | None:
+        interpreter = self.interpreter
+        target = interpreter.steps
+        sink = NullSink()
+        for index in reversed(range(len(self.checkpoints))):
+            checkpoint = self.checkpoints[index]
+            if checkpoint.step >= target:
+                continue
+            end = target
+            if index + 1 < len(self.checkpoints):
+                end = min(end, self.checkpoints[index + 1].step)
+            interpreter.restore(checkpoint.data)
+            source = self.__replay_source()
+            found = None
+            while interpreter.steps < end and not interpreter.finished():
+                if condition(interpreter):
+                    found = interpreter.steps
+                interpreter.step(sink=sink, source=source)
+            if found is not None:
+                self.goto(found)
+                return found
+        self.goto(target)
+        return None
+
+    # Moves back to the last instruction that wrote the cell
+    def reverse_to_write(self, cell: int) -> int | None:
+        # Restoring a checkpoint may lower the code again, so the program is looked up every time
+        def writes(interpreter: Interpreter) -> bool:
+            program = interpreter.program
+            if interpreter.pc >= len(program):
+                return False
+            type = program.types[interpreter.pc]
+            ptr = interpreter.pointer()
+            if type in (OpType.Add, OpType.AddAt, OpType.Clear, OpType.ClearAt, OpType.Input):
+                return ptr == cell
+            elif type == OpType.MulAdd and interpreter.mem[ptr]:
+                targets = program.tables[program.args[interpreter.pc]][0]
+                return ptr == cell or any(ptr + offset == cell for offset, _ in targets)
+            return False
+
+        return self.reverse_until(writes)
+
+    # Moves back to the last entry to the macro (a name from stack_trace_data, eg "divbinx" or "repeat_2")
+    def reverse_to_macro(self, name: str) -> int | None:
+        entries = dict()  # Program -> its instructions that enter the macro
+
+        def enters(interpreter: Interpreter) -> bool:
+            program = interpreter.program
+            if program not in entries:
+                entries[program] = self.macro_entries(name)
+            return interpreter.pc in entries[program]
+
+        return self.reverse_until(enters)
+
+    # Instructions that enter the macro
+    def macro_entries(self, name: str) -> set[int]:
+        program = self.interpreter.program
+        entries = set()
+        for pc, macros in self.interpreter.stack_trace_data[0].items():
+            if name in macros:
+                ip = bisect_left(program.ends, pc)
+                if ip < len(program):
+                    entries.add(ip)
+        return entries
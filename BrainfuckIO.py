@@ -0,0 +1,275 @@
+import io, os, mmap, queue, threading
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import BinaryIO, Iterator, TextIO
+
+
+# What "," does once the input has been consumed
+class EOFPolicy(Enum):
+    Error = 0  # Raises EOFError
+    Unchanged = 1  # Leaves the cell as it is
+    Zero = 2  # Sets the cell to 0
+    Max = 3  # Sets the cell to 255
+
+
+# Returned by Source.read when the input is not available yet
+BLOCKED = -2
+
+
+# Bytes of a string, one per character (as in ord(char) & 255)
+def encode(data: str) -> bytes:
+    try:
+        return data.encode("latin-1")
+    except UnicodeEncodeError:
+        return bytes(ord(char) & 255 for char in data)
+
+
+# Gives the bytes read by a program
+class Source(ABC):
+    def __init__(self) -> None:
+        self.pos = 0  # Number of bytes consumed
+
+    # Returns the next byte, -1 when there is nothing left or BLOCKED
+    @abstractmethod
+    def read(self) -> int:
+        pass
+
+
+# Reads from bytes (or from a string, one byte per character)
+class BytesSource(Source):
+    def __init__(self, data: bytes | str, pos: int = 0) -> None:
+        if isinstance(data, str):
+            data = encode(data)
+        super().__init__()
+        self.data = data
+        self.pos = pos
+
+    def read(self) -> int:
+        if self.pos < len(self.data):
+            self.pos += 1
+            return self.data[self.pos - 1]
+        return -1
+
+
+# Reads a file through mmap, without copying it into memory
+class MmapSource(BytesSource):
+    def __init__(self, path: str, pos: int = 0) -> None:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = b""
+        super().__init__(data, pos)
+
+
+# Reads from a binary file or a file descriptor in chunks. Text streams
+# (consoles without a binary buffer) are read a line at a time, one byte per character.
+class FileSource(Source):
+    def __init__(self, target: BinaryIO | TextIO | int, buffer_size: int = 65536) -> None:
+        super().__init__()
+        self.target = target
+        self.buffer_size = buffer_size
+        self.buffer = b""
+        self.index = 0
+
+    def read(self) -> int:
+        if self.index >= len(self.buffer):
+            if isinstance(self.target, int):
+                self.buffer = os.read(self.target, self.buffer_size)
+            elif isinstance(self.target, io.TextIOBase):
+                self.buffer = encode(self.target.readline(self.buffer_size))
+            elif hasattr(self.target, "read1"):
+                # Does not wait for a full buffer (interactive input)
+                self.buffer = self.target.read1(self.buffer_size)
+            else:
+                self.buffer = self.target.read(self.buffer_size)
+            self.index = 0
+            if not self.buffer:
+                return -1
+        self.index += 1
+        self.pos += 1
+        return self.buffer[self.index - 1]
+
+
+# Remembers every byte read from another source (for replays)
+class RecordingSource(Source):
+    def __init__(self, source: Source) -> None:
+        super().__init__()
+        self.source = source
+        self.data = bytearray()
+
+    def read(self) -> int:
+        char = self.source.read()
+        if char >= 0:
+            self.data.append(char)
+            self.pos += 1
+        return char
+
+
+# Input that is fed while the program runs. Reading before anything has been
+# fed blocks the program (Interpreter.run returns and can be resumed later).
+class FeedSource(Source):
+    def __init__(self) -> None:
+        super().__init__()
+        self.buffer = bytearray()
+        self.index = 0
+        self.closed = False
+
+    def feed(self, data: bytes | str) -> None:
+        if isinstance(data, str):
+            data = data.encode("latin-1")
+        # Drops what has already been read
+        if self.index > 4096 and self.index * 2 > len(self.buffer):
+            del self.buffer[: self.index]
+            self.index = 0
+        self.buffer += data
+
+    # Marks the end of the input
+    def close(self) -> None:
+        self.closed = True
+
+    # Checks if a read would not block
+    def ready(self) -> bool:
+        return self.closed or self.index < len(self.buffer)
+
+    def read(self) -> int:
+        if self.index < len(self.buffer):
+            self.index += 1
+            self.pos += 1
+            return self.buffer[self.index - 1]
+        return -1 if self.closed else BLOCKED
+
+
+# Receives the bytes printed by a program
+class Sink(ABC):
+    @abstractmethod
+    def write(self, value: int) -> None:
+        pass
+
+    # Pushes out whatever is buffered (called before reading input and when the program stops)
+    def flush(self) -> None:
+        pass
+
+
+# Throws the output away
+class NullSink(Sink):
+    def write(self, value: int) -> None:
+        pass
+
+
+# Keeps the output in memory
+class BufferSink(Sink):
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self.write = self.data.append  # Skips a call per byte
+
+    def write(self, value: int) -> None:
+        self.data.append(value)
+
+    def getvalue(self) -> bytes:
+        return bytes(self.data)
+
+
+# Writes the output to a binary file or a file descriptor in chunks. Text
+# streams get one character per byte.
+class FileSink(Sink):
+    # line_buffered: also flushes after every line change
+    def __init__(
+        self,
+        target: BinaryIO | TextIO | int,
+        buffer_size: int = 8192,
+        line_buffered: bool = False,
+    ) -> None:
+        self.target = target
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.line_buffered = line_buffered
+
+    def write(self, value: int) -> None:
+        self.buffer.append(value)
+        if len(self.buffer) >= self.buffer_size or (
+            self.line_buffered and value == 10
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            if isinstance(self.target, int):
+                data = bytes(self.buffer)
+                while data:
+                    data = data[os.write(self.target, data) :]
+            elif isinstance(self.target, io.TextIOBase):
+                self.target.write(self.buffer.decode("latin-1"))
+                self.target.flush()
+            else:
+                self.target.write(self.buffer)
+                self.target.flush()
+            self.buffer.clear()
+
+
+# Sends the output to several sinks
+class TeeSink(Sink):
+    def __init__(self, *sinks: Sink) -> None:
+        self.sinks = sinks
+
+    def write(self, value: int) -> None:
+        for sink in self.sinks:
+            sink.write(value)
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+
+# Hands the output over in chunks to whoever iterates over it (usually
+# another thread). The program blocks if the reader falls too far behind,
+# and gets BrokenPipeError on its next chunk once the reader stops.
+class ChunkSink(Sink):
+    WAIT = 0.1  # Seconds between checks for a stopped reader while the queue is full
+
+    def __init__(self, chunk_size: int = 4096, max_chunks: int = 16) -> None:
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.chunks: queue.Queue = queue.Queue(max_chunks)
+        self.stopped = threading.Event()
+
+    def write(self, value: int) -> None:
+        self.buffer.append(value)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            if not self.__put(bytes(self.buffer)):
+                raise BrokenPipeError("The output is no longer read")
+            self.buffer.clear()
+
+    # Marks the end of the output (error is raised to the reader)
+    def close(self, error: BaseException = None) -> None:
+        chunk = bytes(self.buffer)
+        self.buffer.clear()
+        if not chunk or self.__put(chunk):
+            self.__put(error)
+
+    # Tells the writer nobody reads the output anymore
+    def stop(self) -> None:
+        self.stopped.set()
+
+    # Queues an item, unless the reader stops while waiting. Returns whether it was queued.
+    def __put(self, item: bytes | BaseException | None) -> bool:
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=ChunkSink.WAIT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
@@ -1,120 +1,1003 @@
-import sys, MacrofuckCompiler
+import re, sys, struct, threading, zlib, MacrofuckCompiler
+from bisect import bisect_left
+from collections import deque
+from array import array
+from typing import Callable, Iterator
+from BrainfuckIO import Sink, BufferSink, FileSink, TeeSink, ChunkSink
+from BrainfuckIO import EOFPolicy, Source, BytesSource, FileSource, FeedSource, BLOCKED
+from BrainfuckOptimizer import OpType, Program
+from BrainfuckCodegen import Generator
+from BrainfuckTrace import EventType, Event, Breakpoint, window, render_window
+from BrainfuckTrace import link_trace, unlink_trace
+from BrainfuckTape import PagedTape
+
+ZEROS = memoryview(bytes(65536))  # Copied over the cells of the tape to clear them
+# Message of the MemoryError raised when the pointer leaves the tape (the stack trace follows)
+MEMORY_ERROR = "Pointer exceeded designated memory: "
+
+
+# Everything derived from one macrofuck program that does not change while it
+# runs, shared by all the interpreters of that program: the compiler output,
+# the lowered programs (one per set of boundaries and breakpoints), the
+# generated code and the compiled hot loops.
+class Compiled:
+    PROGRAMS = 8  # Lowered programs kept (breakpoints and debug modes need their own)
+
+    # source: the macrofuck program, code: the brainfuck it compiles to
+    # compiler: None when the program was loaded from an artifact (see BrainfuckArtifact)
+    def __init__(
+        self,
+        source: str,
+        code: str,
+        stack_trace_data: list,
+        min_mem_size: int,
+        compiler: MacrofuckCompiler.Compiler = None,
+    ) -> None:
+        self.source = source
+        self.compiler = compiler
+        self.code = code
+        self.stack_trace_data = stack_trace_data
+        self.min_mem_size = min_mem_size
+        self.programs: dict[tuple, Program] = dict()
+        self.generated: dict[tuple[Program, int], object] = dict()  # (program, memory size) -> code
+        self.loop_functions = dict()  # Generated source -> function
+        self.lock = threading.Lock()
+
+    # Compiles a macrofuck program
+    @staticmethod
+    def from_source(source: str) -> "Compiled":
+        compiler = MacrofuckCompiler.Compiler(source)
+        return Compiled(
+            source,
+            compiler.get_bf(),
+            compiler.get_stack_trace_data(),
+            compiler.min_mem_size,
+            compiler,
+        )
+
+    # Identifies the program lowered with these options in Compiled.programs
+    @staticmethod
+    def key(boundaries: set[int], markers: bool, optimize: bool, breaks: set[int]) -> tuple:
+        return (frozenset(boundaries), markers, optimize, frozenset(breaks))
+
+    # Gives the program lowered with these options, lowering it only once
+    def program(
+        self, boundaries: set[int], markers: bool, optimize: bool, breaks: set[int]
+    ) -> Program:
+        key = Compiled.key(boundaries, markers, optimize, breaks)
+        with self.lock:
+            program = self.programs.pop(key, None)
+        # Bounds are proven for the minimum memory size, so they hold for every interpreter
+        if program is None:
+            program = Program(
+                self.code,
+                boundaries,
+                markers,
+                optimize,
+                breaks,
+                self.min_mem_size,
+            )
+        with self.lock:
+            self.programs[key] = program
+            while len(self.programs) > Compiled.PROGRAMS:
+                evicted = self.programs.pop(next(iter(self.programs)))
+                for entry in [entry for entry in self.generated if entry[0] is evicted]:
+                    del self.generated[entry]
+        return program
+
+    # Gives the whole program as compiled Python code
+    def generate(self, program: Program, size: int):
+        key = (program, size)
+        if key not in self.generated:
+            self.generated[key] = Generator(program, size).build()
+        return self.generated[key]
 
 
 # Runs brainfuck code
 class Interpreter:
-    ISOLATE_DEBUG = False
+    ISOLATE_DEBUG = False  # Only reports code markers (@)
+    DEBUG_ECHO = True  # Prints debug events as they happen
+    DEBUG_EVENTS = 4096  # Number of instructions whose debug events are kept
+    DEBUG_RADIUS = 8  # Cells shown on each side of the pointer
+    # Number of times a loop header runs before the loop gets compiled (tiered mode)
+    HOT_LOOP_THRESHOLD = 32
+    # Snapshot header: magic, version, program checksum, memory size, pointer,
+    # code position, instructions of that position already run, input
+    # position, steps, waiting, halted, saved tape length and stack trace length
+    SNAPSHOT_HEADER = struct.Struct("<4sBIIIIIQQ??II")
+    SNAPSHOT_MAGIC = b"BFSN"
+    SNAPSHOT_VERSION = 3
+    TOKEN = re.compile(r"[-+<>\[\].,]")  # Brainfuck instruction characters
+    # Prefix artifact header: magic, version and output length (followed by the output and a snapshot)
+    PREFIX_HEADER = struct.Struct("<4sBI")
+    PREFIX_MAGIC = b"BFPE"
+    PREFIX_VERSION = 1
+    # Number of macrofuck programs whose compiled form is kept (see Compiled),
+    # and brainfuck characters they may add up to (the newest is always kept)
+    CACHE_SIZE = 16
+    CACHE_CODE = 1 << 26
+    cache: dict[str, Compiled] = dict()
+    cache_lock = threading.Lock()
 
-    def __init__(self, code: str, debug: bool = False, size: int = None):
-        self.compiler = MacrofuckCompiler.Compiler(code)
+    # tiered: compiles hot loops into Python functions while running (ignored in debug and profile modes)
+    # eof: what "," does once the input has been consumed
+    # profile: counts how many times every instruction runs (see Interpreter.counts and BrainfuckProfiler)
+    # paged: keeps the tape in pages allocated on first write (see BrainfuckTape), for big
+    # memories that are mostly untouched. Every cell access is slower.
+    def __init__(
+        self,
+        code: str,
+        debug: bool = False,
+        size: int = None,
+        optimize: bool = True,
+        tiered: bool = False,
+        eof: EOFPolicy = EOFPolicy.Error,
+        profile: bool = False,
+        paged: bool = False,
+    ):
+        self.compiled = Interpreter.compile(code)
+        self.compiler = self.compiled.compiler
         if not size:
-            size = self.compiler.min_mem_size
-        elif size < self.compiler.min_mem_size:
+            size = self.compiled.min_mem_size
+        elif size < self.compiled.min_mem_size:
             raise IndexError(
-                f"This program requires at least {self.compiler.min_mem_size} units of memory."
+                f"This program requires at least {self.compiled.min_mem_size} units of memory."
             )
         self.debug = debug
-        self.code = self.compiler.get_bf()
-        self.stack_trace_data = self.compiler.get_stack_trace_data()
+        self.code = self.compiled.code
+        self.stack_trace_data = self.compiled.stack_trace_data
+        # Debug and profile modes need an instruction to start/end exactly where each macro does
+        self.boundaries = set()
+        if debug or profile:
+            self.boundaries = set(self.stack_trace_data[0]) | {
+                pc + 1 for pc in self.stack_trace_data[1]
+            }
+        self.optimize = optimize
         self.size = size
+        self.generated = None
+        self.tiered = tiered and not debug and not profile
+        self.profile = profile
+        self.eof = eof
+        self.paged = paged
+        self.loop_functions = self.compiled.loop_functions
+        self.checksum = None
+        self.breakpoints: dict[int, list[Breakpoint]] = dict()  # Code position -> breakpoints
+        self.mem = None
+        self.stdin: FileSource = None  # Source of interactive runs
         self.reset()
+        self.__build()
 
-    # Presets all the execution data
+    # Gives the compiled form of the code, compiling it only the first time
+    # (interpreters of the same code share it, least recently used is dropped first)
+    @staticmethod
+    def compile(code: str) -> Compiled:
+        cache = Interpreter.cache
+        with Interpreter.cache_lock:
+            compiled = cache.pop(code, None)
+        if compiled is None:
+            compiled = Compiled.from_source(code)
+        Interpreter.add_compiled(compiled)
+        return compiled
+
+    # Puts a compiled program in the cache (eg one loaded with BrainfuckArtifact.load),
+    # so interpreters of its source use it
+    @staticmethod
+    def add_compiled(compiled: Compiled) -> None:
+        cache = Interpreter.cache
+        with Interpreter.cache_lock:
+            cache.pop(compiled.source, None)
+            cache[compiled.source] = compiled
+            code = sum(len(entry.code) for entry in cache.values())
+            while len(cache) > 1 and (
+                len(cache) > Interpreter.CACHE_SIZE or code > Interpreter.CACHE_CODE
+            ):
+                code -= len(cache.pop(next(iter(cache))).code)
+
+    # Drops every compiled program (interpreters keep the ones they use)
+    @staticmethod
+    def clear_cache() -> None:
+        with Interpreter.cache_lock:
+            Interpreter.cache.clear()
+
+    # Lowers the code again (breakpoints are Break instructions of the program)
+    # and keeps the machine on the same code position (or moves it to
+    # position, with the pointer really at pointer, see Interpreter.__locate for skip)
+    def __build(self, position: int = None, pointer: int = None, skip: int = 0) -> None:
+        if position is None and self.pc and not self.halted:
+            position = self.position()
+            pointer = self.pointer()
+            skip = self.__skipped()
+        breaks = set(self.breakpoints)
+        boundaries = self.boundaries | breaks
+        self.program = self.compiled.program(
+            boundaries, self.debug, self.optimize, breaks
+        )
+        # A boundary there is only added when no instruction starts there
+        # (it would split the instructions and change the step count)
+        if position is not None and not self.__starts_at(position):
+            self.program = self.compiled.program(
+                boundaries | {position}, self.debug, self.optimize, breaks
+            )
+        self.generated = None
+        # Break instructions come first among the instructions of their position
+        # (only pending pointer movement is applied before them)
+        self.break_table = dict()
+        for start, breakpoints in self.breakpoints.items():
+            ip = bisect_left(self.program.starts, start)
+            if ip < len(self.program) and self.program.types[ip] == OpType.Shift:
+                ip += 1
+            if ip < len(self.program) and self.program.types[ip] == OpType.Break:
+                self.break_table[ip] = breakpoints
+        if self.halted:
+            self.pc = len(self.program)
+        elif position is not None:
+            self.pc = self.__locate(position, skip)
+            # The new program may have another movement pending there
+            self.ptr = pointer - self.__pending()
+        self.loop_counts = array("I", [0]) * len(self.program)
+        self.hot_loops = dict()
+        self.debug_actions = dict()
+        # Executions of every instruction (profile mode)
+        self.counts = array("Q", [0]) * len(self.program) if self.profile else None
+        # Loop "[" -> number of times the loop ran 0, 1, 2-3, 4-7... iterations (profile mode)
+        self.loop_histograms: dict[int, array] = dict()
+        self.loop_starts = array("Q", [0]) * len(self.program) if self.profile else None
+
+    # Presets all the execution data. The tape is reused: only the cells up
+    # to the highest one that may have been written (Interpreter.dirty) are
+    # cleared, in place, so running many inputs through the same interpreter
+    # does not allocate a tape per run.
     def reset(self):
         self.ptr = 0
         self.in_tape_pos = 0
-        self.mem = [0] * self.size
+        if self.mem is None or len(self.mem) != self.size:
+            self.mem = self.__tape(self.size)
+        elif self.paged:
+            self.mem.clear()
+        else:
+            for start in range(0, self.dirty, len(ZEROS)):
+                end = min(start + len(ZEROS), self.dirty)
+                self.mem[start:end] = ZEROS[: end - start]
+        # Cells from here on are 0. Runs raise it to one past the highest
+        # cell the pointer (plus Program.write_reach) got to; anything else
+        # that writes the tape must raise it as well.
+        self.dirty = 0
         self.pc = 0
-        self.return_stack = []
+        # Set once the last instruction has run (programs may have no instructions at all)
+        self.halted = False
         self.stack_trace = ["start"]
+        self.trace_chain = None  # stack_trace as a chain (see link_trace), None until needed
+        self.steps = 0  # Instructions executed
+        self.waiting = False  # The last run stopped because the input was not available
+        self.events = deque(maxlen=Interpreter.DEBUG_EVENTS)  # Latest debug events
+        self.breakpoint: Breakpoint = None  # Breakpoint that stopped the last run
+        # Output of a loaded prefix, written by the next run (None when no prefix is pending)
+        self.pending_output: bytes = None
 
-    # Shows debug info
-    def __debug(self, ins: str):
-        result = ""
-        mem_text = list("  " + "  ".join([str(i).rjust(3) for i in self.mem]) + "  ")
-        mem_text[5 + self.ptr * 5] = "#"
-        if not Interpreter.ISOLATE_DEBUG:
-            if self.pc in self.stack_trace_data[0] and (
-                ins != "["
-                or len(self.stack_trace) < len(self.stack_trace_data[0][self.pc])
-                or self.stack_trace[-len(self.stack_trace_data[0][self.pc]) :]
-                != self.stack_trace_data[0][self.pc]
-            ):
-                result += "DEBUG: " + " > ".join(self.stack_trace) + " "
-                self.stack_trace += self.stack_trace_data[0][self.pc]
-                result += ">>> " + " > ".join(self.stack_trace_data[0][self.pc]) + "\n"
-            if self.pc in self.stack_trace_data[1] and (
-                ins != "]" or not self.mem[self.ptr]
+    # Gives an empty tape
+    def __tape(self, size: int) -> bytearray | PagedTape:
+        return PagedTape(size) if self.paged else bytearray(size)
+
+    # Number of cells up to the last non zero one
+    def __used(self) -> int:
+        return self.mem.used() if self.paged else len(self.mem.rstrip(b"\0"))
+
+    # Debug work of every instruction (None when there is nothing to do): whether
+    # it is a marker, the macros it enters, the macros it leaves, whether it is
+    # a "[" or a "]" (loops only enter/leave macros once) and its code span.
+    # Cached for both values of ISOLATE_DEBUG.
+    def __debug_actions(self) -> list:
+        isolate = Interpreter.ISOLATE_DEBUG
+        if isolate not in self.debug_actions:
+            program = self.program
+            entries, exits = self.stack_trace_data
+            # Only positions that start or end macros are looked up
+            entered = set() if isolate else set(entries)
+            left = set() if isolate else set(exits)
+            MARKER, BREAK = OpType.Marker, OpType.Break
+            OPEN, CLOSE = OpType.Open, OpType.Close
+            actions = [None] * len(program)
+            for pc, (type, start, end) in enumerate(
+                zip(program.types, program.starts, program.ends)
             ):
-                for _ in range(len(self.stack_trace_data[1][self.pc])):
-                    self.stack_trace.pop()
-                result += (
-                    "DEBUG: "
-                    + " > ".join(self.stack_trace)
-                    + " <<< "
-                    + " < ".join(self.stack_trace_data[1][self.pc])
-                    + "\n"
-                )
-        result += f"DEBUG: {str(self.pc).rjust(4)} {ins} {str(self.ptr).rjust(3)}  [{''.join(mem_text)}]"
-        return result
+                if (type == MARKER or start in entered or end in left) and type != BREAK:
+                    enter = entries.get(start) if start in entered else None
+                    leave = exits.get(end) if end in left else None
+                    marker = type == MARKER
+                    if marker or enter or leave:
+                        actions[pc] = (
+                            marker,
+                            enter and tuple(enter),
+                            leave and tuple(leave),
+                            type == OPEN,
+                            type == CLOSE,
+                            start,
+                            end,
+                        )
+            self.debug_actions[isolate] = actions
+        return self.debug_actions[isolate]
+
+    # Message of the MemoryError raised at the current stack trace
+    def __memory_error(self) -> str:
+        return MEMORY_ERROR + " > ".join(self.stack_trace)
+
+    # Stack trace of a debug run about to execute the code at position (macros
+    # are expanded in place, so the ones around a position are always the same)
+    def __trace_at(self, position: int) -> list[str]:
+        entries, exits = self.stack_trace_data
+        trace = ["start"]
+        for at in sorted(at for at in set(entries) | set(exits) if at < position):
+            trace += entries.get(at, ())
+            if at in exits:
+                del trace[-len(exits[at]) :]
+        return trace
+
+    # Gives the stack trace as a chain (see link_trace)
+    def __trace_chain(self) -> tuple | None:
+        if self.trace_chain is None:
+            self.trace_chain = link_trace(self.stack_trace)
+        return self.trace_chain
+
+    # Records the debug events of the instruction at pc, about to run with
+    # ptr after steps instructions. The ring buffer keeps one record per
+    # instruction: (step, pc, ptr, stack trace chain before it, action, events
+    # fired, window), expanded into Events when they are read (see
+    # Interpreter.__events). Only markers copy cells: the tape can not be
+    # rebuilt afterwards.
+    def __debug(self, pc: int, action: tuple, ptr: int, steps: int) -> None:
+        marker, enter, leave, opens, closes, start, end = action
+        trace = self.stack_trace
+        before = chain = self.trace_chain
+        fired = 0
+        # Jumping back to a loop that starts a macro does not enter it again
+        if enter and (not opens or tuple(trace[-len(enter) :]) != enter):
+            trace += enter
+            for name in enter:
+                chain = (name, chain)
+            fired = 1
+        if leave and (not closes or not self.mem[ptr]):
+            del trace[-len(leave) :]
+            for _ in leave:
+                chain = chain[1]
+            fired |= 2
+        if marker or fired:
+            cells = window(self.mem, ptr, Interpreter.DEBUG_RADIUS) if marker else None
+            record = (steps, pc, ptr, before, action, fired, cells)
+            self.events.append(record)
+            self.trace_chain = chain
+            if Interpreter.DEBUG_ECHO:
+                for event in self.__events(record):
+                    print(event.render())
+
+    # Turns a record of the ring buffer into its Events (a record without
+    # action is the end of the program)
+    def __events(self, record: tuple) -> list[Event]:
+        step, pc, ptr, chain, action, fired, cells = record
+        if action is None:
+            trace = unlink_trace(chain)
+            return [Event(EventType.End, step, pc, len(self.code), ptr, trace, (), cells)]
+        marker, enter, leave, _, _, start, end = action
+        events = []
+        if marker:
+            trace = unlink_trace(chain)
+            events.append(Event(EventType.Marker, step, pc, start, ptr, trace, (), cells))
+        if fired & 1:
+            for name in enter:
+                chain = (name, chain)
+            trace = unlink_trace(chain)
+            events.append(Event(EventType.Enter, step, pc, start, ptr, trace, enter, None))
+        if fired & 2:
+            for _ in leave:
+                chain = chain[1]
+            trace = unlink_trace(chain)
+            events.append(Event(EventType.Exit, step, pc, end, ptr, trace, leave, None))
+        return events
+
+    # Gives the latest debug events, oldest first
+    def debug_events(self, count: int = None) -> list[Event]:
+        events = [event for record in self.events for event in self.__events(record)]
+        if count is not None:
+            events = events[len(events) - count :] if count else []
+        return events
+
+    # Movement the program has not applied yet before the instruction at pc
+    # (see Program.fold_offsets)
+    def __pending(self) -> int:
+        return self.program.offsets[self.pc] if self.pc < len(self.program) else 0
+
+    # Where the pointer really is: ptr plus the pending movement
+    def pointer(self) -> int:
+        return self.ptr + self.__pending()
+
+    # Brainfuck code position of the next instruction (the end of the code once
+    # the program has run). Unlike pc it does not depend on how the code was
+    # lowered (debug mode, breakpoints, optimizations).
+    def position(self) -> int:
+        return self.program.starts[self.pc] if self.pc < len(self.program) else len(self.code)
+
+    # Number of instructions that start at the current code position and
+    # have already run. Only applied movement (Shift, see
+    # Program.fold_offsets) and Break instructions share the position of the
+    # instruction after them.
+    def __skipped(self) -> int:
+        if self.pc >= len(self.program):
+            return 0
+        return self.pc - bisect_left(self.program.starts, self.position())
+
+    # Gives the instruction at a code position, past the first skip Shift and
+    # Break instructions there (see Interpreter.__skipped). The movement of a
+    # Shift that already ran is in the real pointer, so running it again
+    # would count one step too many.
+    def __locate(self, position: int, skip: int) -> int:
+        program = self.program
+        pc = bisect_left(program.starts, position)
+        while (
+            skip
+            and pc + 1 < len(program)
+            and program.starts[pc] == position
+            and program.types[pc] in (OpType.Shift, OpType.Break)
+        ):
+            pc += 1
+            skip -= 1
+        return pc
+
+    # Moves the machine to a code position, with the pointer really at
+    # pointer. When no instruction of the current program starts there (eg a
+    # state saved in debug mode, where runs are split at every macro
+    # boundary), the code is lowered again with a boundary there.
+    def __seek(self, position: int, pointer: int, skip: int = 0) -> None:
+        if not self.__starts_at(position):
+            # Characters that are not instructions (eg "@" outside debug mode) do nothing
+            token = Interpreter.TOKEN.search(self.code, position)
+            position = token.start() if token else len(self.code)
+            skip = 0
+            if not self.__starts_at(position):
+                self.__build(position, pointer, skip)
+                return
+        self.pc = self.__locate(position, skip)
+        self.ptr = pointer - self.__pending()
+
+    # Checks if an instruction starts at the code position
+    def __starts_at(self, position: int) -> bool:
+        program = self.program
+        pc = bisect_left(program.starts, position)
+        if pc == len(program):
+            return position == len(self.code)
+        return program.starts[pc] == position
+
+    # Renders the current state, showing only the cells around the pointer
+    def render(self, radius: int = None) -> str:
+        if radius is None:
+            radius = Interpreter.DEBUG_RADIUS
+        if self.pc >= len(self.program):
+            position, text = len(self.code), " "
+        else:
+            position, text = self.program.starts[self.pc], self.program.describe(self.pc)
+        ptr = self.pointer()
+        return f"DEBUG: {str(position).rjust(4)} {text} {str(ptr).rjust(3)}  [{render_window(*window(self.mem, ptr, radius), ptr)}]"
+
+    # Picks the sink of a run (the text output is collected in buffer when no sink is given)
+    @staticmethod
+    def __sink(interactive: bool, sink: Sink | None) -> tuple[Sink, BufferSink | None]:
+        if sink is not None:
+            return sink, None
+        buffer = BufferSink()
+        if interactive:
+            sys.stdout.flush()
+            # Consoles like IDLE's only take text
+            stdout = getattr(sys.stdout, "buffer", sys.stdout)
+            return TeeSink(buffer, FileSink(stdout, line_buffered=True)), buffer
+        return buffer, buffer
+
+    # Picks the source of a run (in_tape is read from where the last run left it).
+    # Standard input is read through one source kept across runs, so the
+    # bytes it has buffered are not lost when a run returns early.
+    def __source(self, interactive: bool, in_tape: str, source: Source | None) -> Source:
+        if source is not None:
+            return source
+        if interactive:
+            if self.stdin is None:
+                self.stdin = FileSource(getattr(sys.stdin, "buffer", sys.stdin))
+            self.stdin.pos = self.in_tape_pos
+            return self.stdin
+        return BytesSource(in_tape, self.in_tape_pos)
+
+    # Identifies the program in snapshots
+    def program_checksum(self) -> int:
+        if self.checksum is None:
+            self.checksum = zlib.crc32(self.code.encode("latin-1"))
+        return self.checksum
+
+    # Saves the machine state in a compact binary form. Only the used part of
+    # the tape is stored: everything after the last non zero cell, the
+    # pointer and the minimum memory size is known to be 0. The code position
+    # and the real pointer are saved instead of pc and ptr, so a snapshot can
+    # be restored into an interpreter of the same code built with other options
+    # (along with the instructions of that position that already ran, so the
+    # same program resumes on the same instruction).
+    def snapshot(self) -> bytes:
+        extent = max(
+            self.__used(), self.pointer() + 1, self.compiled.min_mem_size
+        )
+        extent = min(extent, self.size)
+        trace = "\n".join(self.stack_trace).encode()
+        return (
+            Interpreter.SNAPSHOT_HEADER.pack(
+                Interpreter.SNAPSHOT_MAGIC,
+                Interpreter.SNAPSHOT_VERSION,
+                self.program_checksum(),
+                self.size,
+                self.pointer(),
+                self.position(),
+                self.__skipped(),
+                self.in_tape_pos,
+                self.steps,
+                self.waiting,
+                self.halted,
+                extent,
+                len(trace),
+            )
+            + self.mem[:extent]
+            + trace
+        )
+
+    # Loads a state saved with Interpreter.snapshot
+    def restore(self, data: bytes) -> None:
+        header = Interpreter.SNAPSHOT_HEADER
+        if len(data) < header.size:
+            raise ValueError("The snapshot is truncated.")
+        (
+            magic,
+            version,
+            checksum,
+            size,
+            pointer,
+            position,
+            skip,
+            in_tape_pos,
+            steps,
+            waiting,
+            halted,
+            extent,
+            trace_length,
+        ) = header.unpack_from(data)
+        if magic != Interpreter.SNAPSHOT_MAGIC or version != Interpreter.SNAPSHOT_VERSION:
+            raise ValueError("The data is not a snapshot of this version.")
+        if checksum != self.program_checksum():
+            raise ValueError("The snapshot belongs to another program.")
+        if len(data) != header.size + extent + trace_length:
+            raise ValueError("The snapshot is truncated.")
+        if size != self.size:
+            # Generated code has the memory size built in
+            self.size = size
+            self.generated = None
+            self.hot_loops = dict()
+        self.mem = self.__tape(size)
+        self.mem[:extent] = data[header.size : header.size + extent]
+        self.dirty = extent
+        self.stack_trace = data[header.size + extent :].decode().split("\n")
+        self.trace_chain = None
+        self.halted = halted
+        if halted:
+            self.pc, self.ptr = len(self.program), pointer
+        else:
+            self.__seek(position, pointer, skip)
+            # Only debug runs keep the trace, the snapshot may come from another run
+            if self.debug and not Interpreter.ISOLATE_DEBUG:
+                self.stack_trace = self.__trace_at(position)
+        self.in_tape_pos = in_tape_pos
+        self.steps = steps
+        self.waiting = waiting
+        self.breakpoint = None
+        self.pending_output = None
+
+    # Partial evaluation: everything the program does before its first ","
+    # cannot depend on the input, so it is run once here and saved as a
+    # resume artifact (the output printed so far and a snapshot of the state
+    # right before the first input). Interpreter.load_prefix starts later runs
+    # from there. Programs that never read input are evaluated completely.
+    # max_steps bounds the evaluation (the artifact then stops there).
+    def evaluate_prefix(self, max_steps: int = None) -> bytes:
+        if self.pc or self.steps:
+            raise IndexError(
+                "Prefixes are evaluated from the start. Execute Interpreter.reset first."
+            )
+        sink = BufferSink()
+        # The source has no input yet, so the run stops at the first ","
+        self.run(sink=sink, source=FeedSource(), max_steps=max_steps)
+        output = sink.getvalue()
+        return (
+            Interpreter.PREFIX_HEADER.pack(
+                Interpreter.PREFIX_MAGIC, Interpreter.PREFIX_VERSION, len(output)
+            )
+            + output
+            + self.snapshot()
+        )
+
+    # Loads an artifact made by Interpreter.evaluate_prefix. The next run
+    # writes the prefix output first, so it gives the same output as a run
+    # from the start. The embedded snapshot saves code positions, so the
+    # artifact also loads into interpreters of the code built with other
+    # options (debug, profile, optimize, breakpoints).
+    def load_prefix(self, artifact: bytes) -> None:
+        header = Interpreter.PREFIX_HEADER
+        if len(artifact) < header.size:
+            raise ValueError("The prefix artifact is truncated.")
+        magic, version, length = header.unpack_from(artifact)
+        if magic != Interpreter.PREFIX_MAGIC or version != Interpreter.PREFIX_VERSION:
+            raise ValueError("The data is not a prefix artifact of this version.")
+        self.restore(artifact[header.size + length :])
+        self.pending_output = bytes(artifact[header.size : header.size + length])
+
+    # Checks if the whole program has been executed
+    def finished(self) -> bool:
+        return self.halted
+
+    # Breakpoints stop Interpreter.run before the instruction at a code position
+    # (see Interpreter.breakpoint). They are compiled into the program as Break
+    # instructions, so runs without breakpoints are not slowed down. Compiled
+    # code (run_compiled and hot loops) ignores them.
+    # condition(mem, ptr) only stops the run when it holds, eg lambda mem, ptr: mem[ptr] == 0
+    def break_at(
+        self,
+        position: int,
+        condition: Callable[[bytearray, int], bool] = None,
+        name: str = None,
+    ) -> Breakpoint:
+        if not 0 <= position < len(self.code):
+            raise IndexError(f"Position {position} is outside of the code.")
+        breakpoint = self.__add_breakpoint(position, condition, name)
+        self.__build()
+        return breakpoint
+
+    # Breaks on every entry to a macro (its name as it appears in the stack trace)
+    def break_on_macro(
+        self, name: str, condition: Callable[[bytearray, int], bool] = None
+    ) -> list[Breakpoint]:
+        positions = [
+            pc for pc, macros in self.stack_trace_data[0].items() if name in macros
+        ]
+        if not positions:
+            raise KeyError(f"The macro {name} is never entered.")
+        breakpoints = [self.__add_breakpoint(pc, condition, name) for pc in positions]
+        self.__build()
+        return breakpoints
+
+    # Breaks on every code marker (@)
+    def break_on_markers(
+        self, condition: Callable[[bytearray, int], bool] = None
+    ) -> list[Breakpoint]:
+        positions = [pc for pc, char in enumerate(self.code) if char == "@"]
+        breakpoints = [self.__add_breakpoint(pc, condition, "@") for pc in positions]
+        self.__build()
+        return breakpoints
+
+    # Adds a breakpoint without lowering the code again
+    def __add_breakpoint(
+        self, position: int, condition: Callable[[bytearray, int], bool], name: str
+    ) -> Breakpoint:
+        breakpoint = Breakpoint(position, condition, name)
+        self.breakpoints.setdefault(position, []).append(breakpoint)
+        return breakpoint
+
+    def remove_breakpoint(self, breakpoint: Breakpoint) -> None:
+        self.breakpoints[breakpoint.position].remove(breakpoint)
+        if not self.breakpoints[breakpoint.position]:
+            del self.breakpoints[breakpoint.position]
+        self.__build()
+
+    def clear_breakpoints(self) -> None:
+        self.breakpoints = dict()
+        self.__build()
+
+    # Gives the input function used by the runners (it receives the current cell value and returns -1 if the input is blocked)
+    def __reader(self, interactive: bool, source: Source, sink: Sink):
+        read = source.read
+        eof = self.eof
+
+        def reader(value: int) -> int:
+            if interactive:
+                # Prompts have to be visible before blocking on input
+                sink.flush()
+            char = read()
+            if char < 0:
+                if char == BLOCKED:
+                    return -1
+                elif eof == EOFPolicy.Unchanged:
+                    return value
+                elif eof == EOFPolicy.Zero:
+                    return 0
+                elif eof == EOFPolicy.Max:
+                    return 255
+                raise EOFError("The program tried to read past the end of its input.")
+            return char
+
+        return reader
+
+    # Adds a finished loop to its histogram
+    def __loop_exit(self, pc: int, iterations: int) -> None:
+        if pc not in self.loop_histograms:
+            self.loop_histograms[pc] = array("Q", [0]) * 65
+        self.loop_histograms[pc][iterations.bit_length()] += 1
+
+    # Compiles the loop that starts at pc into a Python function
+    # (copies of the same macro share the function). Loops that read input
+    # or have breakpoints are never compiled (False) since they must be able
+    # to stop when the input blocks or a breakpoint is hit.
+    # The functions count the instructions they run, so steps stays exact.
+    def __compile_loop(self, pc: int):
+        close = self.program.args[pc]
+        types = self.program.types[pc:close]
+        if OpType.Input in types or OpType.Break in types:
+            return False
+        source = Generator(self.program, self.size, count=True).generate(pc, close + 1)
+        if source not in self.loop_functions:
+            namespace = {"E": self.__memory_error()}
+            exec(compile(source, "<brainfuck>", "exec"), namespace)
+            self.loop_functions[source] = namespace["run"]
+        return self.loop_functions[source]
 
     # Main runner system
-    def run(self, interactive: bool = False, in_tape: str = ""):
-        length = len(self.code)
-        result = ""
-        if self.pc >= length:
+    # The output goes to sink if one is given, otherwise it is returned as a string
+    # The input comes from source if one is given, otherwise from in_tape (or stdin when interactive)
+    # Returns early after max_steps instructions, when the source blocks (see Interpreter.waiting)
+    # or on a breakpoint (see Interpreter.breakpoint);
+    # calling it again resumes the program (compiled hot loops are not used while a budget is set)
+    def run(
+        self,
+        interactive: bool = False,
+        in_tape: str | bytes = "",
+        sink: Sink = None,
+        source: Source = None,
+        max_steps: int = None,
+    ):
+        types = self.program.types
+        args = self.program.args
+        offsets = self.program.offsets
+        tables = self.program.tables
+        length = len(types)
+        # A prefix that ran the whole program still has its run (maybe without output)
+        if self.halted and self.pending_output is None:
             raise IndexError(
                 "The whole program has been executed. Execute Interpreter.reset to be able to restart the program."
             )
-        while self.pc < length:
-            ins = self.code[self.pc]
-            if self.debug and (not Interpreter.ISOLATE_DEBUG or ins == "@"):
-                print(self.__debug(ins))
-            if ins == "<":
-                self.ptr -= 1
-            elif ins == ">":
-                self.ptr += 1
-            elif ins == "-":
-                self.mem[self.ptr] = (self.mem[self.ptr] - 1) & 255
-            elif ins == "+":
-                self.mem[self.ptr] = (self.mem[self.ptr] + 1) & 255
-            elif ins == ".":
-                result += chr(self.mem[self.ptr])
-                if interactive:
-                    print(chr(self.mem[self.ptr]), end="")
-            elif ins == ",":
-                char = ""
-                if not interactive:
-                    char = in_tape[self.in_tape_pos]
-                    self.in_tape_pos += 1
-                else:
-                    char = sys.stdin.read(1)
-                self.mem[self.ptr] = ord(char) & 255
-            elif ins == "[":
-                self.return_stack.append(self.pc)
-                if not self.mem[self.ptr]:
-                    brks = 1
-                    while brks:
-                        self.pc += 1
-                        brks = (
-                            brks
-                            + (self.code[self.pc] == "[")
-                            - (self.code[self.pc] == "]")
-                        )
-                    self.pc -= 1
-            elif ins == "]":
-                ret = self.return_stack.pop()
-                if self.mem[self.ptr]:
-                    self.pc = ret - 1
-            if self.ptr < 0 or self.ptr >= self.size:
-                raise MemoryError(
-                    "Pointer exceeded designated memory: "
-                    + " > ".join(self.stack_trace)
-                )
-            self.pc += 1
-        if self.debug and not Interpreter.ISOLATE_DEBUG:
-            print(self.__debug(" "))
-        return result
+        debug = self.debug
+        actions = self.__debug_actions() if debug else None
+        if debug:
+            self.__trace_chain()
+        counts = self.counts
+        watching = debug or counts is not None
+        mem = self.mem
+        size = self.size
+        pc = self.pc
+        ptr = self.ptr
+        steps = self.steps
+        limit = -1 if max_steps is None else steps + max_steps
+        self.waiting = False
+        # Resuming from a breakpoint does not hit it again
+        skip = pc if self.breakpoint is not None else -1
+        self.breakpoint = None
+        break_table = self.break_table
+        tiered = self.tiered and max_steps is None
+        loop_counts = self.loop_counts
+        hot_loops = self.hot_loops
+        threshold = Interpreter.HOT_LOOP_THRESHOLD
+        sink, buffer = Interpreter.__sink(interactive, sink)
+        out = sink.write
+        for value in self.pending_output or b"":
+            out(value)
+        self.pending_output = None
+        source = self.__source(interactive, in_tape, source)
+        read = self.__reader(interactive, source, sink)
+        top = ptr  # Highest pointer (compiled loops do not say, so they give size)
+        ADD, MOVE, OPEN, CLOSE = OpType.Add, OpType.Move, OpType.Open, OpType.Close
+        SHIFT, ADD_AT, CLEAR_AT = OpType.Shift, OpType.AddAt, OpType.ClearAt
+        OUTPUT, INPUT, BREAK = OpType.Output, OpType.Input, OpType.Break
+        CLEAR, MULADD, SCAN = OpType.Clear, OpType.MulAdd, OpType.Scan
+        try:
+            while pc < length and steps != limit:
+                steps += 1
+                type = types[pc]
+                if watching:
+                    if counts is not None:
+                        counts[pc] += 1
+                        # Iterations are counted by the executions of "]"
+                        if type == OPEN:
+                            if mem[ptr]:
+                                self.loop_starts[pc] = counts[args[pc]]
+                            else:
+                                self.__loop_exit(pc, 0)
+                        elif type == CLOSE and not mem[ptr]:
+                            header = args[pc]
+                            self.__loop_exit(header, counts[pc] - self.loop_starts[header])
+                    if debug and actions[pc]:
+                        self.__debug(pc, actions[pc], ptr, steps - 1)
+                if type == ADD:
+                    mem[ptr] = (mem[ptr] + args[pc]) & 255
+                elif type == SHIFT:
+                    ptr += args[pc]
+                    if ptr > top:
+                        top = ptr
+                elif type == ADD_AT:
+                    cell = ptr + offsets[pc]
+                    mem[cell] = (mem[cell] + args[pc]) & 255
+                elif type == MOVE:
+                    ptr += args[pc]
+                    if ptr < 0 or ptr >= size:
+                        raise MemoryError(self.__memory_error())
+                    if ptr > top:
+                        top = ptr
+                elif type == OPEN:
+                    if not mem[ptr]:
+                        pc = args[pc]
+                        # The skipped "]" may still close a macro in the trace
+                        if debug and actions[pc]:
+                            self.__debug(pc, actions[pc], ptr, steps - 1)
+                    elif tiered:
+                        loop = hot_loops.get(pc)
+                        if loop is None:
+                            loop_counts[pc] += 1
+                            if loop_counts[pc] >= threshold:
+                                loop = hot_loops[pc] = self.__compile_loop(pc)
+                        if loop:
+                            # Set first: the loop may write anywhere before it fails
+                            top = size
+                            # The loop counts its "[" again
+                            ptr, steps = loop(mem, ptr, out, read, steps - 1)
+                            pc = args[pc]
+                elif type == CLOSE:
+                    if mem[ptr]:
+                        pc = args[pc]
+                        # Loops that keep repeating are hot as well
+                        if tiered:
+                            loop = hot_loops.get(pc)
+                            if loop is None:
+                                loop_counts[pc] += 1
+                                if loop_counts[pc] >= threshold:
+                                    loop = hot_loops[pc] = self.__compile_loop(pc)
+                            if loop:
+                                top = size
+                                ptr, steps = loop(mem, ptr, out, read, steps - 1)
+                                pc = args[pc]
+                elif type == CLEAR:
+                    mem[ptr] = 0
+                elif type == CLEAR_AT:
+                    mem[ptr + offsets[pc]] = 0
+                elif type == MULADD:
+                    cell = ptr + offsets[pc]
+                    value = mem[cell]
+                    if value:
+                        targets, sign, low, high = tables[args[pc]]
+                        if cell + low < 0 or cell + high >= size:
+                            raise MemoryError(self.__memory_error())
+                        value = (sign * value) & 255
+                        for offset, factor in targets:
+                            mem[cell + offset] = (mem[cell + offset] + factor * value) & 255
+                        mem[cell] = 0
+                elif type == SCAN:
+                    step, value = tables[args[pc]]
+                    if step == 1:
+                        ptr = mem.find(value, ptr)
+                        if ptr < 0:
+                            ptr = size
+                    elif step == -1:
+                        ptr = mem.rfind(value, 0, ptr + 1)
+                    else:
+                        while 0 <= ptr < size and mem[ptr] != value:
+                            ptr += step
+                    if ptr < 0 or ptr >= size:
+                        raise MemoryError(self.__memory_error())
+                    if ptr > top:
+                        top = ptr
+                elif type == OUTPUT:
+                    out(mem[ptr])
+                elif type == INPUT:
+                    value = read(mem[ptr])
+                    if value < 0:
+                        steps -= 1
+                        self.waiting = True
+                        break
+                    mem[ptr] = value
+                elif type == BREAK:
+                    steps -= 1
+                    if pc != skip:
+                        for breakpoint in break_table[pc]:
+                            if breakpoint.hit(mem, ptr):
+                                self.breakpoint = breakpoint
+                                break
+                        if self.breakpoint is not None:
+                            break
+                pc += 1
+        finally:
+            self.pc, self.ptr, self.steps = pc, ptr, steps
+            self.halted = pc >= length
+            self.dirty = max(self.dirty, min(top + self.program.write_reach() + 1, size))
+            self.in_tape_pos = source.pos
+            sink.flush()
+        if debug and pc >= length:
+            cells = window(mem, ptr, Interpreter.DEBUG_RADIUS)
+            record = (steps, pc, ptr, self.__trace_chain(), None, 0, cells)
+            self.events.append(record)
+            if Interpreter.DEBUG_ECHO:
+                print(self.__events(record)[0].render())
+        if buffer is not None:
+            return buffer.data.decode("latin-1")
+
+    # Executes a single instruction
+    def step(
+        self,
+        interactive: bool = False,
+        in_tape: str | bytes = "",
+        sink: Sink = None,
+        source: Source = None,
+    ):
+        return self.run(interactive, in_tape, sink, source, 1)
+
+    # Runs the whole program as generated Python code (steps are not counted).
+    # A run that fails leaves the interpreter reset.
+    def run_compiled(
+        self,
+        interactive: bool = False,
+        in_tape: str | bytes = "",
+        sink: Sink = None,
+        source: Source = None,
+    ):
+        if self.pc:
+            raise IndexError(
+                "Compiled programs can only be run from the start. Execute Interpreter.reset to be able to restart the program."
+            )
+        if self.generated is None:
+            self.generated = self.compiled.generate(self.program, self.size)
+        sink, buffer = Interpreter.__sink(interactive, sink)
+        source = self.__source(interactive, in_tape, source)
+        reader = self.__reader(interactive, source, sink)
+
+        def read(value: int) -> int:
+            value = reader(value)
+            if value < 0:
+                raise BlockingIOError("Compiled programs cannot wait for input.")
+            return value
+
+        namespace = {"E": self.__memory_error()}
+        exec(self.generated, namespace)
+        self.dirty = self.size
+        try:
+            ptr = namespace["run"](self.mem, self.ptr, sink.write, read)
+        except BaseException:
+            # Where the generated code stopped is lost, so it cannot be resumed
+            self.reset()
+            raise
+        else:
+            self.pc, self.ptr, self.halted = len(self.program), ptr, True
+            self.in_tape_pos = source.pos
+        finally:
+            sink.flush()
+        if buffer is not None:
+            return buffer.data.decode("latin-1")
+
+    # Runs the program in another thread and yields its output in chunks as it is printed
+    def stream(
+        self,
+        in_tape: str | bytes = "",
+        chunk_size: int = 4096,
+        source: Source = None,
+    ) -> Iterator[bytes]:
+        sink = ChunkSink(chunk_size)
+
+        def worker() -> None:
+            try:
+                self.run(False, in_tape, sink, source)
+            except BaseException as e:
+                sink.close(e)
+            else:
+                sink.close()
+
+        threading.Thread(target=worker, daemon=True).start()
+        # Leaving the loop early closes the generator: the worker stops on its next chunk
+        try:
+            yield from sink
+        finally:
+            sink.stop()
 
 
 if __name__ == "__main__":
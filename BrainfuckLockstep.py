@@ -0,0 +1,261 @@
+from BrainfuckBatch import BatchResult
+from BrainfuckInterpreter import Interpreter, MEMORY_ERROR
+from BrainfuckIO import BufferSink, EOFPolicy
+from BrainfuckOptimizer import OpType
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Lanes that run the same instructions together. All of them have the same
+# pointer, instruction and input position (they only differ in their cells),
+# so every instruction works on one column of the tapes.
+class Group:
+    def __init__(
+        self, lanes, mem, ptr: int, pc: int, steps: int, in_tape_pos: int
+    ) -> None:
+        self.lanes = lanes  # Input index of every row
+        self.mem = mem  # One tape per row
+        self.ptr = ptr
+        self.pc = pc
+        self.steps = steps
+        self.in_tape_pos = in_tape_pos
+
+    # Group of the rows where mask holds
+    def select(self, mask, pc: int = None, ptr: int = None) -> "Group":
+        return Group(
+            self.lanes[mask],
+            self.mem[mask],
+            self.ptr if ptr is None else ptr,
+            self.pc if pc is None else pc,
+            self.steps,
+            self.in_tape_pos,
+        )
+
+
+# Runs one program over many inputs in lockstep with NumPy: the tapes are the
+# rows of one uint8 array and each instruction runs once for all of them.
+# When lanes disagree on a loop condition or on where a scan stops, the
+# group is split and every part goes on by itself; parts of scalar_lanes
+# lanes or less go on in an ordinary Interpreter. Suits programs whose
+# control flow barely depends on the input (fixed-width binx arithmetic);
+# on others the groups soon fall apart into single lanes.
+class Lockstep:
+    def __init__(
+        self,
+        code: str,
+        size: int = None,
+        eof: EOFPolicy = EOFPolicy.Error,
+        scalar_lanes: int = 8,
+    ) -> None:
+        if np is None:
+            raise ImportError("Lockstep execution needs NumPy.")
+        self.code = code
+        self.eof = eof
+        self.scalar_lanes = scalar_lanes
+        self.interpreter = Interpreter(code, size=size, eof=eof)
+        self.program = self.interpreter.program
+        self.size = self.interpreter.size
+
+    # Runs every input, giving the results in input order
+    # (max_steps: inputs that need more instructions fail)
+    def run(self, inputs: list[str | bytes], max_steps: int = None) -> list[BatchResult]:
+        self.inputs = [
+            data.encode("latin-1") if isinstance(data, str) else bytes(data)
+            for data in inputs
+        ]
+        self.outputs = [bytearray() for _ in inputs]
+        self.results: list[BatchResult] = [None] * len(inputs)
+        self.max_steps = max_steps
+        pending = [
+            Group(
+                np.arange(len(inputs)),
+                np.zeros((len(inputs), self.size), dtype=np.uint8),
+                0,
+                0,
+                0,
+                0,
+            )
+        ]
+        while pending:
+            group = pending.pop()
+            if len(group.lanes) <= self.scalar_lanes:
+                for row in range(len(group.lanes)):
+                    self.__run_scalar(group, row)
+            else:
+                pending += self.__run_group(group)
+        return self.results
+
+    def __finish(self, lane: int, steps: int, error: str = None) -> None:
+        self.results[lane] = BatchResult(
+            lane, self.outputs[lane].decode("latin-1"), steps, error
+        )
+
+    def __fail(self, group: Group, mask, error: str) -> None:
+        for lane in group.lanes[mask]:
+            self.__finish(int(lane), group.steps, error)
+
+    # Continues one lane in the interpreter
+    def __run_scalar(self, group: Group, row: int) -> None:
+        lane = int(group.lanes[row])
+        interpreter = self.interpreter
+        interpreter.reset()
+        interpreter.mem[:] = group.mem[row].tobytes()
+        interpreter.dirty = interpreter.size
+        interpreter.ptr = group.ptr
+        interpreter.pc = group.pc
+        interpreter.steps = group.steps
+        interpreter.in_tape_pos = group.in_tape_pos
+        sink = BufferSink()
+        error = None
+        budget = None if self.max_steps is None else self.max_steps - group.steps
+        try:
+            if not interpreter.finished():
+                interpreter.run(in_tape=self.inputs[lane], sink=sink, max_steps=budget)
+            if not interpreter.finished():
+                raise TimeoutError(f"The program did not finish in {self.max_steps} steps.")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.outputs[lane] += sink.getvalue()
+        self.__finish(lane, interpreter.steps, error)
+
+    # Gives the input byte of every row (-1 where the input ended and the EOF policy is Error)
+    def __read(self, group: Group):
+        values = np.empty(len(group.lanes), dtype=np.int16)
+        for row, lane in enumerate(group.lanes):
+            data = self.inputs[lane]
+            if group.in_tape_pos < len(data):
+                values[row] = data[group.in_tape_pos]
+            elif self.eof == EOFPolicy.Unchanged:
+                values[row] = group.mem[row, group.ptr]
+            elif self.eof == EOFPolicy.Zero:
+                values[row] = 0
+            elif self.eof == EOFPolicy.Max:
+                values[row] = 255
+            else:
+                values[row] = -1
+        return values
+
+    # Runs a group until it finishes, fails or splits (returns the parts to run)
+    def __run_group(self, group: Group) -> list[Group]:
+        types = self.program.types
+        args = self.program.args
+        offsets = self.program.offsets
+        tables = self.program.tables
+        length = len(types)
+        size = self.size
+        mem = group.mem
+        pc, ptr, steps = group.pc, group.ptr, group.steps
+        limit = -1 if self.max_steps is None else self.max_steps
+        error = "MemoryError: " + MEMORY_ERROR + "start"
+        try:
+            while pc < length:
+                if steps == limit:
+                    group.steps = steps
+                    self.__fail(
+                        group,
+                        slice(None),
+                        f"TimeoutError: The program did not finish in {limit} steps.",
+                    )
+                    return []
+                type = types[pc]
+                if type == OpType.Break:
+                    pc += 1
+                    continue
+                steps += 1
+                if type == OpType.Add:
+                    mem[:, ptr] += np.uint8(args[pc])
+                elif type == OpType.AddAt:
+                    mem[:, ptr + offsets[pc]] += np.uint8(args[pc])
+                elif type == OpType.Shift:
+                    ptr += args[pc]
+                elif type == OpType.Move:
+                    ptr += args[pc]
+                    if ptr < 0 or ptr >= size:
+                        group.steps = steps
+                        self.__fail(group, slice(None), error)
+                        return []
+                elif type == OpType.Open or type == OpType.Close:
+                    nonzero = mem[:, ptr] != 0
+                    if nonzero.all():
+                        if type == OpType.Close:
+                            pc = args[pc]
+                    elif not nonzero.any():
+                        if type == OpType.Open:
+                            pc = args[pc]
+                    else:
+                        # The lanes disagree: each part goes on by itself
+                        group.steps = steps
+                        enter = pc + 1 if type == OpType.Open else args[pc] + 1
+                        leave = args[pc] + 1 if type == OpType.Open else pc + 1
+                        return [
+                            group.select(~nonzero, leave, ptr),
+                            group.select(nonzero, enter, ptr),
+                        ]
+                elif type == OpType.Clear:
+                    mem[:, ptr] = 0
+                elif type == OpType.ClearAt:
+                    mem[:, ptr + offsets[pc]] = 0
+                elif type == OpType.MulAdd:
+                    cell = ptr + offsets[pc]
+                    values = mem[:, cell]
+                    nonzero = values != 0
+                    if nonzero.any():
+                        targets, sign, low, high = tables[args[pc]]
+                        if cell + low < 0 or cell + high >= size:
+                            # Only the lanes that run the loop leave the memory
+                            group.steps = steps
+                            self.__fail(group, nonzero, error)
+                            return [group.select(~nonzero, pc + 1, ptr)]
+                        values = (values.astype(np.int32) * sign) & 255
+                        for offset, factor in targets:
+                            mem[:, cell + offset] += ((values * factor) & 255).astype(
+                                np.uint8
+                            )
+                        mem[:, cell] = 0
+                elif type == OpType.Scan:
+                    step, value = tables[args[pc]]
+                    stops = np.empty(len(group.lanes), dtype=np.int64)
+                    for row in range(len(group.lanes)):
+                        found = np.flatnonzero(mem[row, ptr::step] == value)
+                        stops[row] = ptr + step * found[0] if len(found) else -1
+                    group.steps = steps
+                    parts = []
+                    failed = stops < 0
+                    if failed.any():
+                        self.__fail(group, failed, error)
+                    for stop in np.unique(stops[~failed]):
+                        parts.append(group.select(stops == stop, pc + 1, int(stop)))
+                    if len(parts) != 1:
+                        return parts
+                    ptr = parts[0].ptr
+                    if failed.any():
+                        group, mem = parts[0], parts[0].mem
+                elif type == OpType.Output:
+                    for row, value in enumerate(mem[:, ptr]):
+                        self.outputs[group.lanes[row]].append(value)
+                elif type == OpType.Input:
+                    values = self.__read(group)
+                    failed = values < 0
+                    group.in_tape_pos += 1
+                    if failed.any():
+                        group.steps = steps
+                        self.__fail(
+                            group,
+                            failed,
+                            "EOFError: The program tried to read past the end of its input.",
+                        )
+                        rest = group.select(~failed, pc, ptr)
+                        rest.mem[:, ptr] = values[~failed]
+                        rest.pc = pc + 1
+                        return [rest] if len(rest.lanes) else []
+                    mem[:, ptr] = values
+                pc += 1
+        finally:
+            group.pc, group.ptr = pc, ptr
+        group.steps = steps
+        for lane in group.lanes:
+            self.__finish(int(lane), steps)
+        return []
@@ -0,0 +1,426 @@
+import re
+from array import array
+from enum import IntEnum
+
+
+# Instruction types of the intermediate representation
+class OpType(IntEnum):
+    Add = 0  # Adds arg to the current cell
+    Move = 1  # Moves the pointer arg cells
+    Output = 2
+    Input = 3
+    Open = 4  # Jumps past the instruction at arg if the current cell is 0
+    Close = 5  # Jumps past the instruction at arg if the current cell is not 0
+    Marker = 6  # Code marker (@)
+    Clear = 7  # Sets the current cell to 0
+    MulAdd = 8  # Adds multiples of the current cell to other cells and clears it (arg: table index)
+    Scan = 9  # Moves the pointer until it finds a value (arg: table index)
+    Break = 10  # Breakpoint placed before the instruction at the same code position (not counted as a step)
+    Shift = 11  # Move that is proven to keep the pointer inside the memory
+    AddAt = 12  # Add to the cell at the instruction offset from the pointer
+    ClearAt = 13  # Clear of the cell at the instruction offset from the pointer
+
+
+# Lowers compiled brainfuck into a compact instruction list.
+# Instructions are stored as parallel arrays: types, args, offsets (see
+# Program.fold_offsets) and the span of brainfuck code (starts/ends) each
+# one was generated from. Instructions
+# that need more than one argument keep them in the tables list:
+#   MulAdd: (targets, sign, lowest offset, highest offset), targets being (offset, factor) pairs
+#   Scan: (step, value)
+class Program:
+    token_pattern = re.compile(r"[+-]+|[<>]+|[.,\[\]@]")
+
+    # boundaries: brainfuck positions where a new instruction must start (runs are never merged across them)
+    # markers: keeps the @ code markers as instructions
+    # optimize: replaces the common loop idioms with single instructions
+    # breaks: brainfuck positions that get a Break instruction (they should be boundaries as well)
+    # size: memory size the pointer bounds are proven for (see Program.prove_bounds)
+    def __init__(
+        self,
+        code: str,
+        boundaries: set[int] = None,
+        markers: bool = False,
+        optimize: bool = True,
+        breaks: set[int] = None,
+        size: int = None,
+    ) -> None:
+        self.code = code
+        self.types = array("B")
+        self.args = array("i")
+        self.starts = array("i")
+        self.ends = array("i")
+        self.offsets = array("i")
+        self.tables = []
+        self.reach = None  # See Program.write_reach
+        self.lower(boundaries or set(), markers, breaks or set())
+        if optimize:
+            self.recognize_idioms(boundaries or set(), markers)
+        if size:
+            self.prove_bounds(size)
+            # Debug events show the pointer of every instruction
+            if optimize and not markers:
+                self.fold_offsets(boundaries or set())
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def append(
+        self, type: OpType, arg: int, start: int, end: int, offset: int = 0
+    ) -> None:
+        self.types.append(type)
+        self.args.append(arg)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.offsets.append(offset)
+
+    # Splits a run of brainfuck into pieces that do not cross any boundary
+    @staticmethod
+    def split_run(start: int, end: int, boundaries: set[int]) -> list[tuple[int, int]]:
+        pieces = []
+        piece_start = start
+        for pc in range(start + 1, end):
+            if pc in boundaries:
+                pieces.append((piece_start, pc))
+                piece_start = pc
+        pieces.append((piece_start, end))
+        return pieces
+
+    # Splits a run of "<" and ">" where it first gets to its lowest and its
+    # highest cell when they lie outside the cells it starts and ends on
+    # (the run must still fail if it goes past the memory and comes back)
+    @staticmethod
+    def split_excursion(code: str, start: int, end: int) -> list[tuple[int, int]]:
+        offset = low = high = 0
+        low_at = high_at = end
+        for pc in range(start, end):
+            offset += 1 if code[pc] == ">" else -1
+            if offset < low:
+                low, low_at = offset, pc + 1
+            elif offset > high:
+                high, high_at = offset, pc + 1
+        cuts = []
+        if low < min(offset, 0):
+            cuts.append(low_at)
+        if high > max(offset, 0):
+            cuts.append(high_at)
+        edges = [start] + sorted(cuts) + [end]
+        return list(zip(edges, edges[1:]))
+
+    # Lowering pass
+    def lower(self, boundaries: set[int], markers: bool, breaks: set[int]) -> None:
+        code = self.code
+        opened = []
+        for token in Program.token_pattern.finditer(code):
+            ins = token.group()
+            start = token.start()
+            if start in breaks and ins[0] not in "+-<>":
+                self.append(OpType.Break, 0, start, start)
+            if ins[0] in "+-<>":
+                pieces = (
+                    Program.split_run(start, token.end(), boundaries)
+                    if boundaries
+                    else [(start, token.end())]
+                )
+                for piece_start, piece_end in pieces:
+                    if piece_start in breaks:
+                        self.append(OpType.Break, 0, piece_start, piece_start)
+                    run = code[piece_start:piece_end]
+                    # Runs that cancel out are only kept when a boundary needs them
+                    keep = piece_start in boundaries or piece_end in boundaries
+                    if run[0] in "+-":
+                        amount = (run.count("+") - run.count("-")) & 255
+                        if amount or keep:
+                            self.append(OpType.Add, amount, piece_start, piece_end - 1)
+                    else:
+                        moves = Program.split_excursion(code, piece_start, piece_end)
+                        offset = run.count(">") - run.count("<")
+                        if offset or keep or len(moves) > 1:
+                            for move_start, move_end in moves:
+                                run = code[move_start:move_end]
+                                offset = run.count(">") - run.count("<")
+                                self.append(OpType.Move, offset, move_start, move_end - 1)
+            elif ins == ".":
+                self.append(OpType.Output, 0, start, start)
+            elif ins == ",":
+                self.append(OpType.Input, 0, start, start)
+            elif ins == "[":
+                opened.append(len(self.types))
+                self.append(OpType.Open, 0, start, start)
+            elif ins == "]":
+                if not opened:
+                    raise SyntaxError(f"Unmatched ']' at position {start}.")
+                partner = opened.pop()
+                self.args[partner] = len(self.types)
+                self.append(OpType.Close, partner, start, start)
+            elif markers:
+                self.append(OpType.Marker, 0, start, start)
+        if opened:
+            raise SyntaxError(
+                f"Unmatched '[' at position {self.starts[opened[-1]]}."
+            )
+
+    # Gets the cell changes of a loop made only of Add and Move instructions
+    def loop_effects(self, open: int) -> tuple[dict[int, int], int] | None:
+        offset = 0
+        effects = dict()
+        for ip in range(open + 1, self.args[open]):
+            if self.types[ip] == OpType.Add:
+                effects[offset] = (effects.get(offset, 0) + self.args[ip]) & 255
+            elif self.types[ip] == OpType.Move:
+                offset += self.args[ip]
+            else:
+                return None
+        return effects, offset
+
+    # Checks if a glider surrounds the loop: k+[k-s>k+]k-
+    def is_glider(self, open: int) -> bool:
+        close = self.args[open]
+        if (
+            open == 0
+            or close + 1 >= len(self.types)
+            or close - open != 4
+            or self.types[open - 1] != OpType.Add
+            or self.types[open + 1] != OpType.Add
+            or self.types[open + 2] != OpType.Move
+            or self.types[open + 3] != OpType.Add
+            or self.types[close + 1] != OpType.Add
+        ):
+            return False
+        k = self.args[open - 1]
+        return (
+            self.args[open + 1] == 256 - k
+            and self.args[open + 3] == k
+            and self.args[close + 1] == 256 - k
+        )
+
+    # Idiom recognition pass: [-] becomes Clear, balanced loops that move
+    # multiples of the current cell become MulAdd and [>] or gliders such as
+    # +[->+]- become Scan.
+    # markers: debug runs leave a macro that ends on the last bracket of an
+    # idiom before running the instruction (a boundary right after it), so
+    # such loops are kept and errors inside them keep the macro trace
+    def recognize_idioms(self, boundaries: set[int], markers: bool = False) -> None:
+        types, args, starts, ends = self.types, self.args, self.starts, self.ends
+        result = Program("", optimize=False)
+        result.tables = self.tables
+        opened = []
+        length = len(types)
+        ip = 0
+        while ip < length:
+            type = types[ip]
+            if type == OpType.Open:
+                close = args[ip]
+                effects = self.loop_effects(ip)
+                # Macro boundaries inside the loop have to stay visible
+                if effects and not any(
+                    starts[i] in boundaries for i in range(ip + 1, close + 1)
+                ) and not (markers and ends[close] + 1 in boundaries):
+                    changes, offset = effects
+                    step = changes.get(0, 0)
+                    if offset == 0 and step in (1, 255):
+                        targets = tuple(
+                            (i, v) for i, v in sorted(changes.items()) if i and v
+                        )
+                        if targets:
+                            self.tables.append(
+                                (
+                                    targets,
+                                    -1 if step == 1 else 1,
+                                    targets[0][0],
+                                    targets[-1][0],
+                                )
+                            )
+                            result.append(
+                                OpType.MulAdd,
+                                len(self.tables) - 1,
+                                starts[ip],
+                                ends[close],
+                            )
+                        else:
+                            result.append(OpType.Clear, 0, starts[ip], ends[close])
+                        ip = close + 1
+                        continue
+                    if close - ip == 2 and types[ip + 1] == OpType.Move:
+                        self.tables.append((args[ip + 1], 0))
+                        result.append(
+                            OpType.Scan, len(self.tables) - 1, starts[ip], ends[close]
+                        )
+                        ip = close + 1
+                        continue
+                    if (
+                        self.is_glider(ip)
+                        and result.types
+                        and result.types[-1] == OpType.Add
+                        and starts[ip] not in boundaries
+                        and starts[close + 1] not in boundaries
+                        and not (markers and ends[close + 1] + 1 in boundaries)
+                    ):
+                        result.types.pop()
+                        result.args.pop()
+                        start = result.starts.pop()
+                        result.ends.pop()
+                        self.tables.append((args[ip + 2], args[ip + 1]))
+                        result.append(
+                            OpType.Scan, len(self.tables) - 1, start, ends[close + 1]
+                        )
+                        ip = close + 2
+                        continue
+                opened.append(len(result))
+                result.append(OpType.Open, 0, starts[ip], ends[ip])
+            elif type == OpType.Close:
+                partner = opened.pop()
+                result.args[partner] = len(result)
+                result.append(OpType.Close, partner, starts[ip], ends[ip])
+            else:
+                result.append(type, args[ip], starts[ip], ends[ip])
+            ip += 1
+        self.types, self.args = result.types, result.args
+        self.starts, self.ends = result.starts, result.ends
+        self.offsets = result.offsets
+
+    # Net pointer movement of every loop body (by the index of its "["), None
+    # when it depends on the data (scans and loops that do not return the
+    # pointer to where they started)
+    def loop_movements(self) -> dict[int, int | None]:
+        movements = dict()
+        bodies = [0]
+        for ip in range(len(self.types)):
+            type = self.types[ip]
+            if type == OpType.Open:
+                bodies.append(0)
+            elif type == OpType.Close:
+                movement = bodies.pop()
+                movements[self.args[ip]] = movement
+                if movement != 0:
+                    bodies[-1] = None
+            elif type in (OpType.Move, OpType.Shift):
+                if bodies[-1] is not None:
+                    bodies[-1] += self.args[ip]
+            elif type == OpType.Scan:
+                bodies[-1] = None
+        return movements
+
+    # Pointer bounds analysis: every Move that provably keeps the pointer in
+    # [0, size) becomes a Shift, which needs no check. The pointer starts at
+    # 0 and is followed as an interval. A balanced loop leaves it as it was
+    # when the loop started. After any other loop only the direction of the
+    # movement is known, if even that. Checked instructions (Move and Scan)
+    # always leave the pointer inside the memory.
+    def prove_bounds(self, size: int) -> None:
+        types, args = self.types, self.args
+        movements = self.loop_movements()
+        low, high = 0, 0
+        headers = []  # Pointer interval at the start of every open loop
+        for ip in range(len(types)):
+            type = types[ip]
+            if type == OpType.Open:
+                movement = movements[ip]
+                if movement is None:
+                    low, high = 0, size - 1
+                elif movement > 0:
+                    high = size - 1
+                elif movement < 0:
+                    low = 0
+                headers.append((low, high))
+            elif type == OpType.Close:
+                low, high = headers.pop()
+            elif type == OpType.Move:
+                low += args[ip]
+                high += args[ip]
+                if low >= 0 and high < size:
+                    types[ip] = OpType.Shift
+                else:
+                    low, high = max(low, 0), min(high, size - 1)
+            elif type == OpType.Scan:
+                if self.tables[args[ip]][0] > 0:
+                    high = size - 1
+                else:
+                    low = 0
+
+    # Offset addressing pass: proven pointer movement (Shift) is not applied
+    # right away but folded into the offsets of the instructions after it, so
+    # code such as ">>+<<-" runs as two AddAt instructions. The movement is
+    # applied (as one Shift, or as part of a checked Move) only before loops,
+    # scans, I/O, breakpoints, markers and boundaries, where the pointer
+    # must be the real one. offsets[ip] is the movement still pending before
+    # the instruction at ip: the pointer is really at ptr + offsets[ip].
+    # Applied movement gets the code position of the instruction after it
+    # (or the end of the code).
+    def fold_offsets(self, boundaries: set[int]) -> None:
+        types, args, starts, ends = self.types, self.args, self.starts, self.ends
+        result = Program("", optimize=False)
+        result.tables = self.tables
+        opened = []
+        offset = 0
+        for ip in range(len(types)):
+            type, arg, start, end = types[ip], args[ip], starts[ip], ends[ip]
+            if start not in boundaries:
+                if type == OpType.Shift:
+                    offset += arg
+                    continue
+                elif type == OpType.Move:
+                    result.append(OpType.Move, offset + arg, start, end, offset)
+                    offset = 0
+                    continue
+                elif offset and type in (OpType.Add, OpType.Clear, OpType.MulAdd):
+                    if type == OpType.Add:
+                        type = OpType.AddAt
+                    elif type == OpType.Clear:
+                        type = OpType.ClearAt
+                    result.append(type, arg, start, end, offset)
+                    continue
+            if offset:
+                result.append(OpType.Shift, offset, start, start, offset)
+                offset = 0
+            if type == OpType.Open:
+                opened.append(len(result))
+            elif type == OpType.Close:
+                partner = opened.pop()
+                result.args[partner] = len(result)
+                arg = partner
+            result.append(type, arg, start, end)
+        if offset:
+            result.append(OpType.Shift, offset, len(self.code), len(self.code), offset)
+        self.types, self.args = result.types, result.args
+        self.starts, self.ends = result.starts, result.ends
+        self.offsets = result.offsets
+
+    # Furthest cell past the pointer an instruction writes (pending movement
+    # and MulAdd targets), computed only the first time
+    def write_reach(self) -> int:
+        if self.reach is None:
+            reach = 0
+            for ip in range(len(self.types)):
+                type = self.types[ip]
+                if type in (OpType.AddAt, OpType.ClearAt):
+                    reach = max(reach, self.offsets[ip])
+                elif type == OpType.MulAdd:
+                    reach = max(reach, self.offsets[ip] + self.tables[self.args[ip]][3])
+            self.reach = reach
+        return self.reach
+
+    # Gives the macrofuck-like text of an instruction
+    def describe(self, ip: int) -> str:
+        type = self.types[ip]
+        arg = self.args[ip]
+        if type == OpType.Add:
+            return f"{arg}+" if arg <= 128 else f"{256 - arg}-"
+        elif type in (OpType.Move, OpType.Shift):
+            return f"{arg}>" if arg >= 0 else f"{-arg}<"
+        elif type == OpType.Clear:
+            return "[-]"
+        elif type == OpType.MulAdd:
+            targets = self.tables[arg][0]
+            return "mul(" + ";".join(f"{o}:{f}" for o, f in targets) + ")" + (
+                f"({self.offsets[ip]})" if self.offsets[ip] else ""
+            )
+        elif type == OpType.AddAt:
+            return (f"{arg}+" if arg <= 128 else f"{256 - arg}-") + f"({self.offsets[ip]})"
+        elif type == OpType.ClearAt:
+            return f"[-]({self.offsets[ip]})"
+        elif type == OpType.Scan:
+            return f"scan({self.tables[arg][0]};{self.tables[arg][1]})"
+        elif type == OpType.Break:
+            return "break"
+        return ".,[]@"[type - OpType.Output]
@@ -0,0 +1,176 @@
+import json, time
+from array import array
+from BrainfuckInterpreter import Interpreter
+from BrainfuckOptimizer import OpType, Program
+
+
+# Gives the macro path (eg ("start", "printcleanintbinx", "divbinx")) of
+# every instruction. Macros are expanded textually, so the path only depends
+# on the code position: the stack trace data is swept once in code order.
+def macro_paths(program: Program, stack_trace_data: list[dict]) -> list[tuple[str, ...]]:
+    entries, exits = stack_trace_data
+    positions = sorted(set(entries) | {end + 1 for end in exits})
+    stack = ["start"]
+    path = tuple(stack)
+    paths = []
+    index = 0
+    for pc in range(len(program)):
+        start = program.starts[pc]
+        while index < len(positions) and positions[index] <= start:
+            position = positions[index]
+            index += 1
+            entered = list(entries.get(position, ()))
+            # Exits are kept outermost first
+            for name in reversed(exits.get(position - 1, ())):
+                if len(stack) > 1 and stack[-1] == name:
+                    stack.pop()
+                elif name in entered:
+                    # Empty macro: it is entered and left at the same position
+                    del entered[len(entered) - 1 - entered[::-1].index(name)]
+            stack += entered
+            path = tuple(stack)
+        paths.append(path)
+    return paths
+
+
+# Costs of a macro path
+class MacroStats:
+    def __init__(self, path: tuple[str, ...]) -> None:
+        self.path = path
+        self.exclusive = 0  # Instructions executed by the macro itself
+        self.inclusive = 0  # Instructions executed by the macro and the macros it calls
+        self.loops = 0  # Loop iterations of the macro itself
+        self.inclusive_loops = 0
+        self.time = 0.0  # Seconds (estimated from the share of instructions)
+
+    def name(self) -> str:
+        return " > ".join(self.path)
+
+
+# Per macro profiler. The interpreter has to be created in profile mode:
+# it then keeps the number of times every instruction runs (the optimized
+# instructions never cross a macro boundary). Counts are aggregated by macro
+# path afterwards, so profiling costs one array increment per instruction.
+# Only interpreted execution is counted (tiered mode is off when profiling
+# and run_compiled is not counted). Times are estimates: the measured run
+# time is shared out in proportion to the instructions executed.
+class Profiler:
+    def __init__(self, interpreter: Interpreter) -> None:
+        if interpreter.counts is None:
+            raise ValueError("The interpreter has to be created with profile=True.")
+        self.interpreter = interpreter
+        self.elapsed = 0.0  # Seconds spent in Profiler.run
+        self.paths = None
+
+    # Runs the interpreter (same arguments as Interpreter.run), measuring the time
+    def run(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.interpreter.run(*args, **kwargs)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def clear(self) -> None:
+        counts = self.interpreter.counts
+        counts[:] = array(counts.typecode, [0]) * len(counts)
+        self.interpreter.loop_histograms.clear()
+        self.elapsed = 0.0
+
+    # Aggregates the instruction counts by macro path
+    def stats(self) -> dict[tuple[str, ...], MacroStats]:
+        program = self.interpreter.program
+        counts = self.interpreter.counts
+        if self.paths is None or len(self.paths) != len(program):
+            self.paths = macro_paths(program, self.interpreter.stack_trace_data)
+        stats: dict[tuple[str, ...], MacroStats] = dict()
+        total = 0
+        for pc, count in enumerate(counts):
+            if not count or program.types[pc] == OpType.Break:
+                continue
+            path = self.paths[pc]
+            if path not in stats:
+                stats[path] = MacroStats(path)
+            stats[path].exclusive += count
+            if program.types[pc] == OpType.Close:
+                stats[path].loops += count
+            total += count
+        for path, entry in list(stats.items()):
+            for depth in range(1, len(path) + 1):
+                prefix = path[:depth]
+                if prefix not in stats:
+                    stats[prefix] = MacroStats(prefix)
+                stats[prefix].inclusive += entry.exclusive
+                stats[prefix].inclusive_loops += entry.loops
+        if total:
+            for entry in stats.values():
+                entry.time = self.elapsed * entry.exclusive / total
+        return stats
+
+    # Flat text report, most expensive macros first
+    def report(self, limit: int = None, inclusive: bool = True) -> str:
+        stats = sorted(
+            self.stats().values(),
+            key=lambda entry: entry.inclusive if inclusive else entry.exclusive,
+            reverse=True,
+        )
+        total = max((entry.inclusive for entry in stats if len(entry.path) == 1), default=0)
+        lines = [
+            f"{'inclusive':>12} {'%':>6} {'exclusive':>12} {'%':>6} {'loops':>10} {'ms':>9}  macro"
+        ]
+        for entry in stats[:limit]:
+            inclusive = entry.inclusive / total * 100 if total else 0
+            exclusive = entry.exclusive / total * 100 if total else 0
+            lines.append(
+                f"{entry.inclusive:>12} {inclusive:>6.2f} {entry.exclusive:>12} {exclusive:>6.2f}"
+                + f" {entry.inclusive_loops:>10} {entry.time * 1000:>9.2f}  {entry.name()}"
+            )
+        return "\n".join(lines)
+
+    # Folded stacks ("start;a;b count" lines), as read by flamegraph.pl and speedscope
+    def collapsed(self) -> str:
+        return "\n".join(
+            f"{';'.join(entry.path)} {entry.exclusive}"
+            for entry in sorted(self.stats().values(), key=lambda entry: entry.path)
+            if entry.exclusive
+        )
+
+    # Chrome trace-event format (chrome://tracing, Perfetto). Each macro path
+    # becomes one complete event as long as its inclusive instruction count
+    # (in microseconds) nested inside its caller, which draws a flame graph.
+    def trace_events(self) -> dict:
+        stats = self.stats()
+        children: dict[tuple[str, ...], list[tuple[str, ...]]] = dict()
+        for path in sorted(stats):
+            if len(path) > 1:
+                children.setdefault(path[:-1], []).append(path)
+        events = []
+        pending = [(path, 0) for path in stats if len(path) == 1]
+        while pending:
+            path, start = pending.pop()
+            entry = stats[path]
+            events.append(
+                {
+                    "name": path[-1],
+                    "ph": "X",
+                    "ts": start,
+                    "dur": entry.inclusive,
+                    "pid": 1,
+                    "tid": 1,
+                    "args": {
+                        "path": entry.name(),
+                        "exclusive": entry.exclusive,
+                        "loops": entry.inclusive_loops,
+                        "ms": round(entry.time * 1000, 3),
+                    },
+                }
+            )
+            # The macro's own instructions come first
+            start += entry.exclusive
+            for child in children.get(path, []):
+                pending.append((child, start))
+                start += stats[child].inclusive
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.trace_events(), f)
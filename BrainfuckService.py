@@ -0,0 +1,411 @@
+import argparse, asyncio, contextlib, hashlib, json, multiprocessing, os, socket, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import BrainfuckArtifact
+from BrainfuckInterpreter import Interpreter
+from BrainfuckIO import BufferSink, EOFPolicy
+
+LANGUAGES = ("macrofuck", "varfuck")
+
+
+# Imports the transpiler quietly (its grammar is built, and printed, on import).
+# Only varfuck jobs need it, so it is loaded by the first one of every
+# worker: it reads its grammar from the current directory, and failing to
+# load it only fails those jobs.
+def load_transpiler():
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import VarfuckTranspiler
+    return VarfuckTranspiler
+
+
+# Turns a source into macrofuck code (runs in a worker), saving its compiled
+# form as an artifact when a path is given
+def prepare(language: str, source: str, compiled_path: str = None) -> str:
+    code = load_transpiler().transpile(source) if language == "varfuck" else source
+    # Compiling and lowering it here already warms the worker for the runs that follow
+    Interpreter(code)
+    if compiled_path is not None:
+        BrainfuckArtifact.save(Interpreter.compile(code), compiled_path)
+    return code
+
+
+# Runs one job in a worker. Workers keep the compiled programs in
+# Interpreter.cache, so only their first job of a program compiles it (or
+# maps its artifact, see BrainfuckArtifact, unless the artifact is stale).
+# Time limits are checked between slices of SLICE instructions, and hot loops
+# are not compiled then (a compiled loop could not be stopped at the
+# deadline). Only jobs without any limit run in tiered mode: with the
+# default timeout of the service, no job does.
+def run_job(
+    code: str,
+    in_tape: str | bytes,
+    max_steps: int | None,
+    timeout: float | None,
+    eof: str,
+    submitted: float,
+    compiled_path: str = None,
+) -> dict:
+    started = time.time()
+    sink = BufferSink()
+    error = None
+    interpreter = None
+    warm = code in Interpreter.cache
+    ready = started
+    try:
+        if not warm and compiled_path is not None and os.path.exists(compiled_path):
+            try:
+                BrainfuckArtifact.install(compiled_path)
+            except ValueError:
+                # Written by another version: compiled again and replaced
+                BrainfuckArtifact.save(Interpreter.compile(code), compiled_path)
+        interpreter = Interpreter(
+            code, tiered=max_steps is None and timeout is None, eof=EOFPolicy[eof]
+        )
+        ready = time.time()
+        if max_steps is None and timeout is None:
+            interpreter.run(in_tape=in_tape, sink=sink)
+        else:
+            deadline = None if timeout is None else ready + timeout
+            while not interpreter.finished():
+                budget = Service.SLICE
+                if max_steps is not None:
+                    budget = min(budget, max_steps - interpreter.steps)
+                    if budget <= 0:
+                        raise TimeoutError(f"The program did not finish in {max_steps} steps.")
+                if deadline is not None and time.time() >= deadline:
+                    raise TimeoutError(f"The program did not finish in {timeout} seconds.")
+                interpreter.run(in_tape=in_tape, sink=sink, max_steps=budget)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finished = time.time()
+    return {
+        "output": sink.getvalue().decode("latin-1"),
+        "steps": 0 if interpreter is None else interpreter.steps,
+        "error": error,
+        "warm": warm,
+        "queued": round(max(started - submitted, 0.0), 6),
+        "compile_seconds": round(ready - started, 6),
+        "seconds": round(finished - ready, 6),
+    }
+
+
+# Content-addressed store of macrofuck code: the key of a source is the
+# sha256 of its language and text, so the same source is only transpiled
+# once. With a directory the code is also kept on disk (<key>.mf), along with
+# the compiled artifact (<key>.bfa), and survives restarts. Only the most
+# recently used codes stay in memory (least recently used is dropped first):
+# with a directory they are read again, without one they have to be
+# submitted again.
+class Artifacts:
+    CODES = 256  # Codes kept in memory
+
+    def __init__(self, directory: str = None) -> None:
+        self.directory = directory
+        self.code: dict[str, str] = dict()  # Key -> macrofuck code
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(language: str, source: str) -> str:
+        return hashlib.sha256(f"{language}\0{source}".encode("utf-8")).hexdigest()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".mf")
+
+    # Where the compiled artifact of a key is kept (None without a directory)
+    def compiled_path(self, key: str) -> str | None:
+        return None if self.directory is None else os.path.join(self.directory, key + ".bfa")
+
+    # Gives the code of a key (None if it is not stored)
+    def get(self, key: str) -> str | None:
+        if len(key) != 64 or key.strip("0123456789abcdef"):
+            raise ValueError(f"Invalid artifact key {key}.")
+        code = self.code.pop(key, None)
+        if code is None and self.directory is not None and os.path.exists(self.__path(key)):
+            with open(self.__path(key)) as f:
+                code = f.read()
+        if code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.__keep(key, code)
+        return code
+
+    # Keeps a code in memory as the most recently used one
+    def __keep(self, key: str, code: str) -> None:
+        self.code.pop(key, None)
+        self.code[key] = code
+        while len(self.code) > Artifacts.CODES:
+            del self.code[next(iter(self.code))]
+
+    def put(self, key: str, code: str) -> None:
+        self.__keep(key, code)
+        if self.directory is not None:
+            # Written aside and renamed, so readers never see half a file
+            temporary = self.__path(key) + f".{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                f.write(code)
+            os.replace(temporary, self.__path(key))
+
+    def __len__(self) -> int:
+        return len(self.code)
+
+
+# Long-running execution service: takes varfuck or macrofuck sources and
+# inputs over a Unix socket (or a localhost TCP port) and runs them on a
+# pool of worker processes that stay warm between jobs. Requests and
+# responses are JSON objects, one per line:
+# {"op": "run", "source": ..., "language": "varfuck", "input": ..., "max_steps": ..., "timeout": ...}
+# (or "artifact": <key> instead of the source) runs a program,
+# {"op": "compile", "source": ..., "language": ...} only stores it and gives its key,
+# {"op": "metrics"} gives the queue and latency metrics.
+# max_steps and timeout (seconds) can only lower the limits of the service.
+class Service:
+    SLICE = 1 << 20  # Instructions run between time limit checks
+    LATENCIES = 1024  # Latest jobs kept for the latency metrics
+
+    def __init__(
+        self,
+        processes: int = None,
+        cache_dir: str = None,
+        max_steps: int = None,
+        timeout: float = 60.0,
+        eof: EOFPolicy = EOFPolicy.Error,
+    ) -> None:
+        self.processes = processes or os.cpu_count() or 1
+        self.artifacts = Artifacts(cache_dir)
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.eof = eof
+        self.pool = None
+        self.preparing: dict[str, asyncio.Future] = dict()  # Keys being transpiled
+        self.started = time.time()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=Service.LATENCIES)  # (queued, compile, run, total) seconds
+
+    def __start_pool(self) -> None:
+        if self.pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            self.pool = ProcessPoolExecutor(self.processes, context)
+
+    async def __submit(self, function, *args):
+        self.__start_pool()
+        pool = self.pool
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, function, *args
+            )
+        except BrokenProcessPool:
+            # A worker died (eg it was killed): the jobs of the pool fail and
+            # the next ones get a new pool
+            if self.pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+            raise
+        finally:
+            self.in_flight -= 1
+
+    # Gives the key and the macrofuck code of a request, transpiling it if needed
+    async def artifact(self, request: dict) -> tuple[str, str]:
+        if "artifact" in request:
+            code = self.artifacts.get(request["artifact"])
+            if code is None:
+                raise KeyError(f"Unknown artifact {request['artifact']}.")
+            return request["artifact"], code
+        language = request.get("language", "macrofuck")
+        if language not in LANGUAGES:
+            raise ValueError(f"Unknown language {language}.")
+        source = request["source"]
+        key = Artifacts.key(language, source)
+        code = self.artifacts.get(key)
+        if code is not None:
+            return key, code
+        # Requests of the same source wait for the first one
+        if key not in self.preparing:
+            self.preparing[key] = asyncio.ensure_future(
+                self.__submit(
+                    prepare, language, source, self.artifacts.compiled_path(key)
+                )
+            )
+        try:
+            code = await asyncio.shield(self.preparing[key])
+        finally:
+            self.preparing.pop(key, None)
+        self.artifacts.put(key, code)
+        return key, code
+
+    # Limit of a job: the one of the request, capped by the one of the service
+    # (missing or null means the one of the service)
+    @staticmethod
+    def __limit(request: dict, name: str, limit: int | float | None) -> int | float | None:
+        value = request.get(name)
+        if value is None:
+            return limit
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"{name} has to be a positive number.")
+        return value if limit is None else min(value, limit)
+
+    async def run(self, request: dict) -> dict:
+        key, code = await self.artifact(request)
+        submitted = time.time()
+        self.submitted += 1
+        result = await self.__submit(
+            run_job,
+            code,
+            request.get("input", ""),
+            Service.__limit(request, "max_steps", self.max_steps),
+            Service.__limit(request, "timeout", self.timeout),
+            self.eof.name,
+            submitted,
+            self.artifacts.compiled_path(key),
+        )
+        total = time.time() - submitted
+        self.completed += 1
+        if result["error"] is not None:
+            self.failed += 1
+        self.latencies.append(
+            (result["queued"], result["compile_seconds"], result["seconds"], total)
+        )
+        return {"ok": True, "artifact": key, **result, "latency": round(total, 6)}
+
+    @staticmethod
+    def __percentiles(values: list[float]) -> dict:
+        if not values:
+            return {"p50": None, "p95": None, "max": None}
+        values = sorted(values)
+        return {
+            "p50": round(values[len(values) // 2], 6),
+            "p95": round(values[min(len(values) * 95 // 100, len(values) - 1)], 6),
+            "max": round(values[-1], 6),
+        }
+
+    def metrics(self) -> dict:
+        columns = list(zip(*self.latencies)) or [[], [], [], []]
+        return {
+            "ok": True,
+            "uptime": round(time.time() - self.started, 3),
+            "processes": self.processes,
+            "queued": max(self.in_flight - self.processes, 0),
+            "running": min(self.in_flight, self.processes),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "artifacts": len(self.artifacts),
+            "cache_hits": self.artifacts.hits,
+            "cache_misses": self.artifacts.misses,
+            "queue_seconds": Service.__percentiles(columns[0]),
+            "compile_seconds": Service.__percentiles(columns[1]),
+            "run_seconds": Service.__percentiles(columns[2]),
+            "latency_seconds": Service.__percentiles(columns[3]),
+        }
+
+    # Answers one request
+    async def handle(self, request: dict) -> dict:
+        try:
+            op = request.get("op", "run")
+            if op == "run":
+                return await self.run(request)
+            if op == "compile":
+                key, _ = await self.artifact(request)
+                return {"ok": True, "artifact": key}
+            if op == "metrics":
+                return self.metrics()
+            raise ValueError(f"Unknown operation {op}.")
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    # Answers the requests of a connection in order
+    async def __connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Requests are JSON objects.")
+                except ValueError as e:
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Serves until cancelled, on a Unix socket when path is given and on
+    # localhost:port otherwise
+    async def serve(self, path: str = None, port: int = 8642) -> None:
+        self.__start_pool()
+        if path is not None:
+            if os.path.exists(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(
+                self.__connection, path, limit=1 << 26
+            )
+        else:
+            server = await asyncio.start_server(
+                self.__connection, "127.0.0.1", port, limit=1 << 26
+            )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+
+# Sends one request to a running service and gives its response
+def call(request: dict, path: str = None, port: int = 8642) -> dict:
+    if path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection(("127.0.0.1", port))
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode("utf-8") + b"\n")
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serves Varfuck and Macrofuck runs on a pool of warm workers."
+    )
+    parser.add_argument("--socket", help="Unix socket path (localhost TCP otherwise)")
+    parser.add_argument("--port", type=int, default=8642)
+    parser.add_argument("--processes", type=int, help="worker processes (all cores by default)")
+    parser.add_argument("--cache-dir", help="directory that keeps the transpiled artifacts")
+    parser.add_argument("--max-steps", type=int, help="default instruction budget of a job")
+    parser.add_argument(
+        "--timeout", type=float, default=60.0, help="default seconds a job may run"
+    )
+    parser.add_argument(
+        "--eof", choices=[policy.name for policy in EOFPolicy], default="Error"
+    )
+    arguments = parser.parse_args()
+    service = Service(
+        arguments.processes,
+        arguments.cache_dir,
+        arguments.max_steps,
+        arguments.timeout,
+        EOFPolicy[arguments.eof],
+    )
+    try:
+        asyncio.run(service.serve(arguments.socket, arguments.port))
+    except KeyboardInterrupt:
+        pass
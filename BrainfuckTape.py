@@ -0,0 +1,163 @@
+# Sparse tape for programs with a big memory that only touch a part of it.
+# Cells are stored in fixed-size pages that are only allocated when a non
+# zero value is written to them, every other page reads as zeros. It
+# behaves like the bytearray tape for everything the runners use (indexing,
+# slicing, find and rfind), only slower per access.
+class PagedTape:
+    PAGE_BITS = 12  # Pages of 4096 cells
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.page_size = 1 << PagedTape.PAGE_BITS
+        self.mask = self.page_size - 1
+        self.pages: dict[int, bytearray] = dict()  # Page number -> cells
+        self.zero = bytes(self.page_size)  # Shared by all the untouched pages
+
+    def __len__(self) -> int:
+        return self.size
+
+    # Drops every page
+    def clear(self) -> None:
+        self.pages = dict()
+
+    # Number of cells up to the last non zero one
+    def used(self) -> int:
+        for number in sorted(self.pages, reverse=True):
+            extent = len(self.pages[number].rstrip(b"\0"))
+            if extent:
+                return (number << PagedTape.PAGE_BITS) + extent
+        return 0
+
+    def __index(self, index: int) -> int:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("Tape index out of range.")
+        return index
+
+    def __getitem__(self, index: int | slice) -> int | bytes:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            if step != 1:
+                return bytes(self[i] for i in range(start, stop, step))
+            return self.read(start, stop)
+        index = self.__index(index)
+        page = self.pages.get(index >> PagedTape.PAGE_BITS)
+        return 0 if page is None else page[index & self.mask]
+
+    def __setitem__(self, index: int | slice, value) -> None:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            value = bytes(value)
+            if step != 1 or len(value) != stop - start:
+                raise ValueError("Tape slices can only be replaced by as many cells.")
+            self.write(start, value)
+            return
+        index = self.__index(index)
+        number = index >> PagedTape.PAGE_BITS
+        page = self.pages.get(number)
+        if page is None:
+            if not value:
+                return
+            page = self.pages[number] = bytearray(self.page_size)
+        page[index & self.mask] = value
+
+    # Gives the cells from start to stop
+    def read(self, start: int, stop: int) -> bytes:
+        chunks = []
+        while start < stop:
+            number, offset = start >> PagedTape.PAGE_BITS, start & self.mask
+            end = min(stop - start, self.page_size - offset)
+            page = self.pages.get(number, self.zero)
+            chunks.append(page[offset : offset + end])
+            start += end
+        return b"".join(chunks)
+
+    # Replaces the cells from start on (zeros do not allocate pages)
+    def write(self, start: int, data: bytes) -> None:
+        position = 0
+        while position < len(data):
+            number, offset = start >> PagedTape.PAGE_BITS, start & self.mask
+            end = min(len(data) - position, self.page_size - offset)
+            chunk = data[position : position + end]
+            page = self.pages.get(number)
+            if page is None and chunk.count(0) != len(chunk):
+                page = self.pages[number] = bytearray(self.page_size)
+            if page is not None:
+                page[offset : offset + end] = chunk
+            position += end
+            start += end
+
+    # First index from start on with the value (-1 if there is none).
+    # Untouched pages are skipped whole: they contain only zeros.
+    def find(self, value: int, start: int = 0) -> int:
+        if start >= self.size:
+            return -1
+        start = max(start, 0)
+        number = start >> PagedTape.PAGE_BITS
+        page = self.pages.get(number)
+        if page is None:
+            if not value:
+                return start
+        else:
+            index = page.find(value, start & self.mask)
+            if index >= 0:
+                index += number << PagedTape.PAGE_BITS
+                return index if index < self.size else -1
+        if not value:
+            # The first page after this one that is untouched or has a zero
+            number += 1
+            while number in self.pages:
+                index = self.pages[number].find(0)
+                if index >= 0:
+                    break
+                number += 1
+            else:
+                index = 0
+            index += number << PagedTape.PAGE_BITS
+            return index if index < self.size else -1
+        for later in sorted(other for other in self.pages if other > number):
+            index = self.pages[later].find(value)
+            if index >= 0:
+                index += later << PagedTape.PAGE_BITS
+                return index if index < self.size else -1
+        return -1
+
+    # Last index before end with the value (-1 if there is none)
+    def rfind(self, value: int, start: int = 0, end: int = None) -> int:
+        end = self.size if end is None else min(end, self.size)
+        if end <= start:
+            return -1
+        start = max(start, 0)
+        number = (end - 1) >> PagedTape.PAGE_BITS
+        low = start >> PagedTape.PAGE_BITS
+        base = number << PagedTape.PAGE_BITS
+        page = self.pages.get(number)
+        if page is None:
+            if not value:
+                return end - 1
+        else:
+            index = page.rfind(value, max(start - base, 0), end - base)
+            if index >= 0:
+                return base + index
+        if not value:
+            number -= 1
+            while number >= low:
+                base = number << PagedTape.PAGE_BITS
+                page = self.pages.get(number)
+                if page is None:
+                    return base + self.mask
+                index = page.rfind(0, max(start - base, 0))
+                if index >= 0:
+                    return base + index
+                number -= 1
+            return -1
+        earlier_pages = sorted(
+            (other for other in self.pages if low <= other < number), reverse=True
+        )
+        for earlier in earlier_pages:
+            base = earlier << PagedTape.PAGE_BITS
+            index = self.pages[earlier].rfind(value, max(start - base, 0))
+            if index >= 0:
+                return base + index
+        return -1
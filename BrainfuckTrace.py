@@ -0,0 +1,100 @@
+from enum import Enum
+from typing import Callable
+
+
+# Kinds of debug events
+class EventType(Enum):
+    Enter = 0  # Macros were entered
+    Exit = 1  # Macros were left
+    Marker = 2  # A code marker (@) was reached
+    End = 3  # The program finished
+
+
+# Something that happened during a debug run. Markers and the end of the
+# program keep the cells around the pointer, so they can be rendered later.
+class Event:
+    def __init__(
+        self,
+        type: EventType,
+        step: int,
+        pc: int,
+        position: int,
+        ptr: int,
+        trace: tuple[str, ...],
+        macros: tuple[str, ...] = (),
+        window: tuple[int, bytes] = None,
+    ) -> None:
+        self.type = type
+        self.step = step  # Instructions executed before the event
+        self.pc = pc  # Instruction index
+        self.position = position  # Brainfuck code position
+        self.ptr = ptr
+        self.trace = trace  # Stack trace after the event
+        self.macros = macros  # Macros entered or left
+        self.window = window  # First cell index and the cells around the pointer
+
+    def render(self) -> str:
+        if self.type == EventType.Enter:
+            return (
+                "DEBUG: "
+                + " > ".join(self.trace[: len(self.trace) - len(self.macros)])
+                + " >>> "
+                + " > ".join(self.macros)
+            )
+        elif self.type == EventType.Exit:
+            return (
+                "DEBUG: " + " > ".join(self.trace) + " <<< " + " < ".join(self.macros)
+            )
+        text = "@" if self.type == EventType.Marker else " "
+        return f"DEBUG: {str(self.position).rjust(4)} {text} {str(self.ptr).rjust(3)}  [{render_window(*self.window, self.ptr)}]"
+
+
+# Debug events keep their stack traces as chains of (name, parent chain)
+# (None is the empty trace): traces that grow from one another share their
+# common part, so an event costs no copy of the trace. They only become
+# tuples when the events are read.
+def link_trace(names) -> tuple | None:
+    chain = None
+    for name in names:
+        chain = (name, chain)
+    return chain
+
+
+def unlink_trace(chain: tuple | None) -> tuple[str, ...]:
+    names = []
+    while chain is not None:
+        names.append(chain[0])
+        chain = chain[1]
+    return tuple(reversed(names))
+
+
+# Copies the cells around the pointer
+def window(mem: bytearray, ptr: int, radius: int = 8) -> tuple[int, bytes]:
+    start = max(0, ptr - radius)
+    return start, bytes(mem[start : ptr + radius + 1])
+
+
+# Formats cells that start at the given index, with "#" after the pointed cell
+# (the window may be cut on both sides)
+def render_window(start: int, cells: bytes, ptr: int) -> str:
+    text = list("  " + "  ".join([str(i).rjust(3) for i in cells]) + "  ")
+    if 0 <= ptr - start < len(cells):
+        text[5 + (ptr - start) * 5] = "#"
+    return ("..." if start else "") + "".join(text) + "..."
+
+
+# Stops a run right before the instruction at a brainfuck code position is
+# executed. condition(mem, ptr) can restrict it to some cell values.
+class Breakpoint:
+    def __init__(
+        self,
+        position: int,
+        condition: Callable[[bytearray, int], bool] = None,
+        name: str = None,
+    ) -> None:
+        self.position = position
+        self.condition = condition
+        self.name = name  # What it was set on (macro name, "@" or None)
+
+    def hit(self, mem: bytearray, ptr: int) -> bool:
+        return self.condition is None or self.condition(mem, ptr)
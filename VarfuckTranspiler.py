@@ -1,3 +1,4 @@
+import contextlib, os
 from enum import Enum
 import EBNF
 import VirtualParser as VP
@@ -130,6 +131,7 @@ class Lexer(VP.BaseLexer):
     def next_token(self) -> VP.Token:
         start_pos = self.pos
         if not self.do_cache or self.pos not in self.cache:
+            token_pos = self.pos
             if self.pos >= len(self.stream):
                 self.cache[start_pos] = (self.pos, VP.Token(TokenType.EOF, None))
             else:
@@ -148,6 +150,7 @@ class Lexer(VP.BaseLexer):
                         )
                         break
                     char = self.stream[self.pos]
+                token_pos = self.pos
                 if self.pos not in self.cache:
                     if char in self.word_chars:
                         r = self.process_word()
@@ -187,6 +190,8 @@ class Lexer(VP.BaseLexer):
                             )
                         else:
                             raise KeyError(f"{char} is not a valid character.")
+            if start_pos in self.cache and self.cache[start_pos][1].pos is None:
+                self.cache[start_pos][1].pos = token_pos
         self.pos = self.cache[start_pos][0]
         return self.cache[start_pos][1]
 
@@ -962,8 +967,12 @@ class Processor:
         ),
     }
 
-    def __init__(self, tree: VP.ASTNode) -> None:
+    # source: the Varfuck code of the tree. When given, every statement is
+    # wrapped in a MAC_ placeholder named "vk:<line>", so the stack trace
+    # data of the compiled code maps it back to the statement.
+    def __init__(self, tree: VP.ASTNode, source: str = None) -> None:
         self.tree = Cleaner(tree).clean()
+        self.source = source
         self.macros: dict[str, Macro] = dict()
         self.consts: dict[str, Any] = dict()
         self.local_consts: dict[str, Any] = dict()
@@ -1031,6 +1040,18 @@ class Processor:
             raise NameError(f"The macro {name} is undefined.")
         return mi, self.__var_struct(node.data[2]), self.__var_struct(node.data[3])
 
+    # Line of the first token of a node
+    def __line(self, node: ASTNode | VP.Token) -> int | None:
+        if type(node) == VP.Token:
+            if node.pos is None:
+                return None
+            return self.source.count("\n", 0, node.pos) + 1
+        for i in node.data:
+            line = self.__line(i)
+            if line is not None:
+                return line
+        return None
+
     def __macro_def(self, node: ASTNode) -> tuple[str, Macro]:
         name = node.data[1].value
         self.local_consts = dict()
@@ -1044,66 +1065,76 @@ class Processor:
         def process_block(data: ASTNode) -> None:
             for i in data.data:
                 stmt: ASTNode = i.data[0]
-                if stmt.name == "const_def":
-                    cdef = self.__const_def(stmt)
-                    self.local_consts[cdef[0]] = cdef[1]
-                elif stmt.name == "call":
-                    invc = self.__call(stmt)
-                    if invc[0].macro.name == "lessbinx":
-                        mac.data.goto(None)
-                        mac.data.add("@")
-                    mac.data.do_call(
-                        invc[0],
-                        invc[2],
-                        invc[0].test_params(),
-                        invc[1],
-                        invc[0].test_ret(),
-                    )
-                    if invc[0].macro.name == "lessbinx":
-                        mac.data.goto(None)
-                        mac.data.add("@")
-                elif stmt.name == "return":
-                    s = []
-                    if len(stmt.data) == 1:
-                        s = self.__var_struct(stmt.data[0])
-                    mac.data.fuck(s)
-                elif stmt.name == "ifel":
-                    expr = self.__const_expr(stmt.data[0])
-                    if (
-                        len(expr.data) == 1
-                        and type(expr.data[0]) == ConstRef
-                        and expr.data[0].name in mac.data.pos_table
-                    ):
-                        mac.data.start_if(expr.data[0].name)
-                        process_block(stmt.data[1])
-                        mac.data.continue_if()
-                        process_block(stmt.data[2])
-                        mac.data.end_if()
-                    else:
-                        expr_y = ConstExpr(["1 if ("]) + expr + ConstExpr([") else 0"])
-                        expr_n = ConstExpr(["0 if ("]) + expr + ConstExpr([") else 1"])
-                        mac.data.start_repeat(expr_y)
-                        process_block(stmt.data[1])
-                        mac.data.end_repeat()
-                        mac.data.start_repeat(expr_n)
-                        process_block(stmt.data[2])
-                        mac.data.end_repeat()
-                elif stmt.name == "while_or_repeat":
-                    expr = self.__const_expr(stmt.data[0])
-                    if (
-                        len(expr.data) == 1
-                        and type(expr.data[0]) == ConstRef
-                        and expr.data[0].name in mac.data.pos_table
-                    ):
-                        mac.data.start_while(expr.data[0].name)
-                        process_block(stmt.data[1])
-                        mac.data.end_while()
-                    else:
-                        mac.data.start_repeat(expr)
-                        process_block(stmt.data[1])
-                        mac.data.end_repeat()
+                line = None
+                if self.source is not None and stmt.name != "const_def":
+                    line = self.__line(stmt)
+                if line is not None:
+                    mac.data.add(f"MAC_(vk:{line};")
+                process_statement(stmt)
+                if line is not None:
+                    mac.data.add(")")
+
+        def process_statement(stmt: ASTNode) -> None:
+            if stmt.name == "const_def":
+                cdef = self.__const_def(stmt)
+                self.local_consts[cdef[0]] = cdef[1]
+            elif stmt.name == "call":
+                invc = self.__call(stmt)
+                if invc[0].macro.name == "lessbinx":
+                    mac.data.goto(None)
+                    mac.data.add("@")
+                mac.data.do_call(
+                    invc[0],
+                    invc[2],
+                    invc[0].test_params(),
+                    invc[1],
+                    invc[0].test_ret(),
+                )
+                if invc[0].macro.name == "lessbinx":
+                    mac.data.goto(None)
+                    mac.data.add("@")
+            elif stmt.name == "return":
+                s = []
+                if len(stmt.data) == 1:
+                    s = self.__var_struct(stmt.data[0])
+                mac.data.fuck(s)
+            elif stmt.name == "ifel":
+                expr = self.__const_expr(stmt.data[0])
+                if (
+                    len(expr.data) == 1
+                    and type(expr.data[0]) == ConstRef
+                    and expr.data[0].name in mac.data.pos_table
+                ):
+                    mac.data.start_if(expr.data[0].name)
+                    process_block(stmt.data[1])
+                    mac.data.continue_if()
+                    process_block(stmt.data[2])
+                    mac.data.end_if()
+                else:
+                    expr_y = ConstExpr(["1 if ("]) + expr + ConstExpr([") else 0"])
+                    expr_n = ConstExpr(["0 if ("]) + expr + ConstExpr([") else 1"])
+                    mac.data.start_repeat(expr_y)
+                    process_block(stmt.data[1])
+                    mac.data.end_repeat()
+                    mac.data.start_repeat(expr_n)
+                    process_block(stmt.data[2])
+                    mac.data.end_repeat()
+            elif stmt.name == "while_or_repeat":
+                expr = self.__const_expr(stmt.data[0])
+                if (
+                    len(expr.data) == 1
+                    and type(expr.data[0]) == ConstRef
+                    and expr.data[0].name in mac.data.pos_table
+                ):
+                    mac.data.start_while(expr.data[0].name)
+                    process_block(stmt.data[1])
+                    mac.data.end_while()
                 else:
-                    raise SyntaxError(f"{stmt.name}???")
+                    mac.data.start_repeat(expr)
+                    process_block(stmt.data[1])
+                    mac.data.end_repeat()
+            else:
+                raise SyntaxError(f"{stmt.name}???")
 
         process_block(node.data[4])
         mac.data.end()
@@ -1126,6 +1157,17 @@ class Processor:
         return str(self.start)
 
 
+# Transpiles Varfuck source into Macrofuck. lines names every statement
+# after its source line (see Processor).
+def transpile(source: str, lines: bool = False) -> str:
+    # The parser prints its progress
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        tree = Parser(source).parse()
+    processor = Processor(tree, source if lines else None)
+    processor.process()
+    return processor.build()
+
+
 # TODO temp
 def show_AST(node: ASTNode | VP.Token, level=0):
     print(level * "\t", end="")
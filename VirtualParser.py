@@ -7,9 +7,10 @@ class TokenType(Enum):
 
 
 class Token:
-    def __init__(self, type: Enum, value: str) -> None:
+    def __init__(self, type: Enum, value: str, pos: int = None) -> None:
         self.type = type
         self.value = value
+        self.pos = pos  # Position in the source (when the lexer knows it)
 
     def __eq__(self, __value: object) -> bool:
         if type(__value) == Token:
@@ -0,0 +1,19 @@
+import os, sys
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BrainfuckInterpreter import Interpreter
+
+# Programs shared by the tests (imported with "from conftest import ...")
+PROGRAM = "getintbinx(8)printcleanintbinx(8)endl()"  # Prints the number it reads
+PRINT = "implant(8;5)printcleanintbinx(8)endl()"  # Prints 5 without reading anything
+# Divides by 0, which kills the program
+KILLED = "implant(8;37)implant(8;5)divbinx(8)printcleanintbinx(8)endl()"
+
+
+# Debug runs do not print their events
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    monkeypatch.setattr(Interpreter, "DEBUG_ECHO", False)
@@ -0,0 +1,56 @@
+import asyncio, os
+import pytest
+import BrainfuckArtifact
+from BrainfuckInterpreter import Interpreter
+from BrainfuckService import Service
+from conftest import PROGRAM
+
+
+def test_loaded_program_runs_the_same(tmp_path):
+    path = str(tmp_path / "program.bfa")
+    BrainfuckArtifact.save(Interpreter.compile(PROGRAM), path)
+    compiled = BrainfuckArtifact.load(path)
+    assert compiled.code == Interpreter.compile(PROGRAM).code
+    Interpreter.add_compiled(compiled)
+    interpreter = Interpreter(PROGRAM)
+    assert interpreter.compiled is compiled
+    assert interpreter.run(in_tape="42\n") == "42\n"
+
+
+def test_other_optimizer_is_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / "program.bfa")
+    BrainfuckArtifact.save(Interpreter.compile(PROGRAM), path)
+    monkeypatch.setattr(BrainfuckArtifact, "OPTIMIZER", BrainfuckArtifact.OPTIMIZER ^ 1)
+    with pytest.raises(ValueError):
+        BrainfuckArtifact.load(path)
+
+
+def test_truncated_artifact_is_rejected(tmp_path):
+    path = str(tmp_path / "program.bfa")
+    BrainfuckArtifact.save(Interpreter.compile(PROGRAM), path)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    with pytest.raises(ValueError):
+        BrainfuckArtifact.load(path)
+
+
+def test_service_replaces_stale_artifacts(tmp_path, monkeypatch):
+    # Not compiled by other tests, so the workers do not inherit it
+    source = "getintbinx(6)printcleanintbinx(6)endl()"
+
+    def run(request: dict) -> dict:
+        service = Service(processes=1, cache_dir=str(tmp_path))
+
+        async def main() -> dict:
+            try:
+                return await service.handle(request)
+            finally:
+                service.pool.shutdown()
+
+        return asyncio.run(main())
+
+    key = run({"op": "compile", "source": source})["artifact"]
+    monkeypatch.setattr(BrainfuckArtifact, "OPTIMIZER", BrainfuckArtifact.OPTIMIZER ^ 1)
+    response = run({"artifact": key, "input": "9\n"})
+    assert response["ok"] and response["error"] is None and response["output"] == "9\n"
+    assert BrainfuckArtifact.load(str(tmp_path / f"{key}.bfa")).source == source
@@ -0,0 +1,42 @@
+import asyncio, socket
+from BrainfuckAsync import Session
+from BrainfuckInterpreter import Interpreter
+from BrainfuckIO import EOFPolicy
+from conftest import PROGRAM
+
+ECHO = ",[.,]"  # Copies the input up to its end (or a 0 byte)
+
+
+def test_feed_after_the_program_blocks():
+    async def main() -> str:
+        session = Session(Interpreter(PROGRAM), yield_every=1000)
+        task = asyncio.create_task(session.run())
+        while not session.interpreter.waiting:
+            await asyncio.sleep(0)
+        # Blocked on its first read, the program keeps the loop free
+        assert not task.done()
+        session.feed("4")
+        await asyncio.sleep(0)
+        session.feed("2\n")
+        return await task
+
+    assert asyncio.run(main()) == "42\n"
+
+
+def test_reader_and_writer_reach_the_end():
+    async def main() -> bytes:
+        ours, theirs = socket.socketpair()
+        reader, writer = await asyncio.open_connection(sock=theirs)
+        ours.sendall(b"hello " * 1000)
+        ours.shutdown(socket.SHUT_WR)
+        session = Session(Interpreter(ECHO, eof=EOFPolicy.Zero), reader, writer, 100, 64)
+        assert await session.run() is None
+        writer.close()
+        await writer.wait_closed()
+        output = bytearray()
+        while data := ours.recv(65536):
+            output += data
+        ours.close()
+        return bytes(output)
+
+    assert asyncio.run(main()) == b"hello " * 1000
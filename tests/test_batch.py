@@ -0,0 +1,47 @@
+import pytest
+from BrainfuckBatch import Batch
+from BrainfuckInterpreter import Interpreter
+from conftest import PROGRAM
+
+
+def results(code: str, inputs: list[str], **options) -> list[tuple]:
+    batch = Batch(code, processes=1, **options)
+    return [(r.output, r.steps, r.error) for r in batch.run(inputs)]
+
+
+@pytest.mark.parametrize("prefix", [False, True])
+def test_outputs_and_steps(prefix):
+    code = PROGRAM
+    assert results(code, ["7\n", "42\n"], prefix=prefix) == results(
+        code, ["7\n", "42\n"], tiered=False
+    )
+    assert [output for output, _, _ in results(code, ["7\n", "42\n"], prefix=prefix)] == [
+        "7\n",
+        "42\n",
+    ]
+
+
+def test_prefix_that_never_stops():
+    for output, steps, error in results("+[]", ["", "a"], max_steps=1000, prefix=True):
+        assert steps == 1000 and error.startswith("TimeoutError")
+
+
+def test_prefix_steps_count_against_the_budget():
+    # 3 steps of prefix, then 2 more per input
+    for prefix in (False, True):
+        assert results("+[-]+,.", ["a"], max_steps=5, prefix=prefix) == [("a", 5, None)]
+        [(_, steps, error)] = results("+[-]+,.", ["a"], max_steps=4, prefix=prefix)
+        assert steps == 4 and error.startswith("TimeoutError")
+
+
+def test_prefix_that_fails():
+    [(output, _, error)] = results(".<", ["a"], prefix=True)
+    assert output == "\0" and error.startswith("MemoryError")
+
+
+def test_program_is_compiled_before_the_workers_start():
+    code = PROGRAM
+    Interpreter.clear_cache()
+    batch = Batch(code, processes=1)
+    assert Interpreter.cache[code] is batch.interpreter.compiled
+    assert batch.interpreter.program in Interpreter.cache[code].programs.values()
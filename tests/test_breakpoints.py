@@ -0,0 +1,57 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+from conftest import PRINT
+
+TWICE = PRINT + "endl()"
+
+
+def test_stop_on_macro_entries():
+    interpreter = Interpreter(TWICE)
+    first, second = interpreter.break_on_macro("endl")
+    assert interpreter.run() == "5"
+    assert interpreter.breakpoint is first and first.name == "endl"
+    assert interpreter.position() == first.position
+    # Resuming does not hit the same breakpoint again
+    assert interpreter.run() == "\n"
+    assert interpreter.breakpoint is second
+    assert interpreter.run() == "\n"
+    assert interpreter.breakpoint is None and interpreter.finished()
+
+
+def test_condition_blocks_a_hit():
+    hits = []
+
+    # Only stops on the second call
+    def condition(mem, ptr) -> bool:
+        hits.append(ptr)
+        return len(hits) == 2
+
+    interpreter = Interpreter(TWICE)
+    interpreter.break_on_macro("endl", condition)
+    assert interpreter.run() == "5\n"
+    assert interpreter.breakpoint.position == max(interpreter.stack_trace_data[0])
+    assert interpreter.run() == "\n" and len(hits) == 2
+    never = Interpreter(TWICE)
+    never.break_on_macro("endl", lambda mem, ptr: False)
+    assert never.run() == "5\n\n" and never.breakpoint is None
+
+
+def test_stop_on_markers():
+    interpreter = Interpreter("+@++@+++.")
+    interpreter.break_on_markers()
+    cells = []
+    while not interpreter.finished():
+        interpreter.run()
+        cells.append(interpreter.mem[0])
+    assert cells == [1, 3, 6]
+
+
+def test_remove_breakpoints():
+    interpreter = Interpreter(TWICE)
+    first, _ = interpreter.break_on_macro("endl")
+    interpreter.remove_breakpoint(first)
+    assert interpreter.run() == "5\n"
+    interpreter.clear_breakpoints()
+    assert interpreter.run() == "\n" and interpreter.finished()
+    with pytest.raises(KeyError):
+        interpreter.break_on_macro("missing")
@@ -0,0 +1,41 @@
+import inspect, sys
+import pytest
+from BrainfuckCodegen import Generator
+from BrainfuckInterpreter import Interpreter
+from conftest import PROGRAM
+
+
+def test_failed_run_leaves_the_interpreter_reset():
+    interpreter = Interpreter("+.<", size=4)
+    with pytest.raises(MemoryError):
+        interpreter.run_compiled()
+    assert not interpreter.finished() and interpreter.pc == 0
+    assert bytes(interpreter.mem) == bytes(4)
+    with pytest.raises(MemoryError):
+        interpreter.run()
+    assert interpreter.steps == 3
+
+
+def test_finished_run():
+    interpreter = Interpreter(PROGRAM)
+    assert interpreter.run_compiled(in_tape="42\n") == "42\n"
+    assert interpreter.finished()
+    with pytest.raises(IndexError):
+        interpreter.run_compiled(in_tape="42\n")
+
+
+def test_parts_are_not_nested(monkeypatch):
+    # Cuts the code into many small functions
+    monkeypatch.setattr(Generator, "part_size", 4)
+    monkeypatch.setattr(Generator, "hoist_size", 8)
+    interpreter = Interpreter(PROGRAM)
+    source = Generator(interpreter.program, interpreter.size).generate()
+    main = source[source.index("def " + source.split("\nrun=")[1] + "(") :]
+    assert main.count("\n") > 200
+    # Calling every part from the next one would go past the limit
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + 100)
+    try:
+        assert interpreter.run_compiled(in_tape="42\n") == "42\n"
+    finally:
+        sys.setrecursionlimit(limit)
@@ -0,0 +1,52 @@
+import pytest
+import VarfuckTranspiler
+from BrainfuckCoverage import Coverage
+from BrainfuckInterpreter import Interpreter
+from conftest import PRINT
+
+# Counts down from 3 (statements on lines 2 to 6 and 8)
+VARFUCK = """{num size} main {} {} [
+    {size, 3} implant {a} {};
+    {size, 1} implant {b} {};
+    a [
+        {size} printintbinx {} {a}
+        {size} subbinx {a} {a, b}
+    ]
+    {} endl {} {};
+]
+
+{8} main {} {}"""
+
+
+def test_breakpoints_lower_the_program_again():
+    expected = Interpreter(PRINT, profile=True)
+    expected.run()
+    expected = Coverage(expected).dump()
+    interpreter = Interpreter(PRINT, profile=True)
+    coverage = Coverage(interpreter)
+    coverage.dump()  # Finds the paths of the program before the breakpoint
+    # Macro entries are boundaries already: only a Break instruction is added
+    interpreter.break_at(max(interpreter.stack_trace_data[0]))
+    assert interpreter.run() == "5"
+    assert interpreter.run() == "\n"
+    assert coverage.dump() == expected
+    interpreter.clear_breakpoints()
+    interpreter.reset()
+    interpreter.run()
+    assert coverage.dump() == expected
+
+
+def test_varfuck_lines():
+    source = VarfuckTranspiler.transpile(VARFUCK, lines=True)
+    assert "MAC_(vk:5;" in source
+    assert "vk:" not in VarfuckTranspiler.transpile(VARFUCK)
+    interpreter = Interpreter(source, profile=True)
+    assert interpreter.run() == "321\n"
+    coverage = Coverage(interpreter)
+    lines = coverage.lines()
+    assert sorted(lines) == [2, 3, 4, 5, 6, 8]
+    assert all(entry.covered for entry in lines.values())
+    # The loop body runs three times, the line before it once
+    assert lines[6].executions > 2 * lines[3].executions
+    assert not any(name.startswith("vk:") for name in coverage.macros())
+    assert {line for _, _, line, _, _, _ in coverage.loops()} <= {4, 5, 6}
@@ -0,0 +1,50 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+from conftest import KILLED, PROGRAM
+
+
+@pytest.fixture(autouse=True)
+def events(monkeypatch):
+    monkeypatch.setattr(Interpreter, "DEBUG_EVENTS", 1 << 20)
+
+
+def error(code: str, **options) -> str:
+    with pytest.raises(MemoryError) as info:
+        Interpreter(code, **options).run()
+    return str(info.value)
+
+
+def test_errors_keep_the_macro_trace():
+    expected = error(KILLED, debug=True, optimize=False)
+    assert expected.endswith("start > divbinx > ifel > ifel_true > kill")
+    assert error(KILLED, debug=True) == expected
+
+
+def test_optimized_events_match():
+    events = []
+    for optimize in (False, True):
+        interpreter = Interpreter(PROGRAM, debug=True, optimize=optimize)
+        assert interpreter.run(in_tape="42\n") == "42\n"
+        events.append(
+            [
+                (event.type, event.position, event.ptr, event.trace, event.macros)
+                for event in interpreter.debug_events()
+            ]
+        )
+    assert events[0] == events[1]
+
+
+def test_events_are_built_when_read():
+    interpreter = Interpreter("implant(8;5)@endl()", debug=True)
+    assert interpreter.run() == "\n"
+    events = interpreter.debug_events()
+    assert [event.type.name for event in events] == [
+        "Enter", "Exit", "Marker", "Enter", "Exit", "End"
+    ]
+    marker, end = events[2], events[-1]
+    assert marker.trace == ("start",) and marker.window == (0, bytes([0] * 5 + [1, 0, 1]))
+    assert end.window == marker.window and end.position == len(interpreter.code)
+    assert [event.type for event in interpreter.debug_events(2)] == [
+        event.type for event in events[-2:]
+    ]
+    assert interpreter.debug_events(0) == []
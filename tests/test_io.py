@@ -0,0 +1,61 @@
+import io, os
+import pytest
+from BrainfuckInterpreter import Interpreter
+from BrainfuckIO import BytesSource, EOFPolicy, FileSource, MmapSource
+
+# Reads one byte more than it is given
+READ = "+++++,."
+
+
+@pytest.mark.parametrize(
+    "eof, output",
+    [(EOFPolicy.Unchanged, "\x05"), (EOFPolicy.Zero, "\0"), (EOFPolicy.Max, "\xff")],
+)
+def test_eof_policies(eof, output):
+    assert Interpreter(READ, eof=eof).run() == output
+    assert Interpreter(READ, eof=eof).run_compiled() == output
+    assert Interpreter(READ, eof=eof).run(in_tape="a") == "a"
+
+
+def test_eof_error():
+    with pytest.raises(EOFError):
+        Interpreter(READ).run()
+    with pytest.raises(EOFError):
+        Interpreter(READ).run_compiled()
+
+
+def read_all(source) -> bytes:
+    data = bytearray()
+    while (char := source.read()) >= 0:
+        data.append(char)
+    assert source.pos == len(data)
+    return bytes(data)
+
+
+def test_file_sources(tmp_path):
+    path = tmp_path / "input"
+    path.write_bytes(b"abc\xff" * 10)
+    # Buffered (read1), raw (read) and text files, and a file descriptor
+    with open(path, "rb") as f:
+        assert read_all(FileSource(f, buffer_size=3)) == b"abc\xff" * 10
+    with open(path, "rb", buffering=0) as f:
+        assert read_all(FileSource(f, buffer_size=3)) == b"abc\xff" * 10
+    assert read_all(FileSource(io.StringIO("ab\ncā"))) == b"ab\nc\x01"
+    read, write = os.pipe()
+    os.write(write, b"xyz")
+    os.close(write)
+    try:
+        assert read_all(FileSource(read, buffer_size=2)) == b"xyz"
+    finally:
+        os.close(read)
+
+
+def test_mmap_source(tmp_path):
+    path = tmp_path / "input"
+    path.write_bytes(b"42\n")
+    assert read_all(MmapSource(str(path))) == b"42\n"
+    source = MmapSource(str(path), pos=1)
+    assert source.read() == ord("2")
+    path.write_bytes(b"")
+    assert read_all(MmapSource(str(path))) == b""
+    assert read_all(BytesSource("aā")) == b"a\x01"
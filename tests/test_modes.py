@@ -0,0 +1,56 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+from conftest import KILLED, PROGRAM
+
+INPUTS = ["0\n", "7\n", "42\n", "255\n"]
+
+
+@pytest.fixture(autouse=True)
+def hot(monkeypatch):
+    # Compiles loops in tiered mode as soon as possible
+    monkeypatch.setattr(Interpreter, "HOT_LOOP_THRESHOLD", 1)
+
+
+# Output of a run, or the error it raised
+def outcome(run) -> tuple:
+    try:
+        return run(), None
+    except MemoryError as e:
+        return None, "MemoryError: " + str(e)
+
+
+def plain(code: str, data: str, **options) -> tuple:
+    interpreter = Interpreter(code, **options)
+    output, error = outcome(lambda: interpreter.run(in_tape=data))
+    return output, interpreter.steps, error
+
+
+@pytest.mark.parametrize("data", INPUTS)
+@pytest.mark.parametrize("code", [PROGRAM, KILLED])
+def test_modes_agree(code, data):
+    output, steps, error = plain(code, data)
+    assert plain(code, data, paged=True) == (output, steps, error)
+    # Compiled loops count their steps in blocks, so a failed run may stop short of them
+    tiered = plain(code, data, tiered=True)
+    assert (tiered[0], tiered[2]) == (output, error)
+    if error is None:
+        assert tiered[1] == steps
+    compiled = Interpreter(code)
+    assert outcome(lambda: compiled.run_compiled(in_tape=data)) == (output, error)
+    # Debug and unoptimized runs split the code into other instructions
+    for options in ({"debug": True}, {"optimize": False}):
+        run = plain(code, data, **options)
+        assert run[0] == output and (run[2] is None) == (error is None)
+
+
+@pytest.mark.parametrize("code", [PROGRAM, KILLED])
+def test_lockstep_agrees(code):
+    pytest.importorskip("numpy")
+    from BrainfuckLockstep import Lockstep
+
+    results = Lockstep(code, scalar_lanes=0).run(INPUTS)
+    for data, result in zip(INPUTS, results):
+        output, steps, error = plain(code, data)
+        assert (result.error, result.steps) == (error, steps)
+        if error is None:
+            assert result.output == output
@@ -0,0 +1,63 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+from BrainfuckOptimizer import OpType, Program
+from conftest import KILLED
+
+
+def test_moves_that_come_back_are_split():
+    assert Program.split_excursion(">><<<<>", 0, 7) == [(0, 2), (2, 6), (6, 7)]
+    assert Program.split_excursion(">>><", 0, 4) == [(0, 3), (3, 4)]
+    program = Program("<>.", size=1)
+    # The way back is proven once the first move is checked
+    assert list(program.types) == [OpType.Move, OpType.Shift, OpType.Output]
+
+
+@pytest.mark.parametrize("options", [{}, {"tiered": True}, {"optimize": False}])
+@pytest.mark.parametrize("code", ["<>.", "-----.<<<<>>>>++++[..]"])
+def test_moves_past_the_memory_fail(code, options):
+    with pytest.raises(MemoryError):
+        Interpreter(code, size=1, **options).run()
+    with pytest.raises(MemoryError):
+        Interpreter(code, size=1, **options).run_compiled()
+
+
+# Names of the pointer movements of a program proven for size (markers keeps
+# every Shift where it is)
+def movements(code: str, size: int) -> list[str]:
+    program = Program(code, markers=True, size=size)
+    return [
+        OpType(type).name for type in program.types if type in (OpType.Move, OpType.Shift)
+    ]
+
+
+def test_proven_movements():
+    # A balanced loop leaves the pointer where it found it
+    assert movements(">[>.<-]>>", 4) == ["Shift"] * 4
+    assert movements(">[>.<-]>>", 3) == ["Shift"] * 3 + ["Move"]
+    # After an unbalanced loop only the direction is known
+    assert movements("+[>.]<", 8) == ["Move", "Move"]
+    # Scans leave the pointer inside the memory, on their side of it
+    assert movements("+[>]<", 8) == ["Move"]
+    assert movements(">+[<]>", 8) == ["Shift", "Shift"]
+
+
+@pytest.mark.parametrize(
+    "code, output", [("+>+>+>+<<<[>.]", "\1\1\1\0"), ("+>+>+>+<<<[>]>.", "\0")]
+)
+def test_proofs_hold_on_bigger_tapes(code, output):
+    interpreter = Interpreter(code)
+    assert interpreter.size == 4
+    with pytest.raises(MemoryError):
+        interpreter.run()
+    # The program proven for the minimum size is shared
+    bigger = Interpreter(code, size=6)
+    assert bigger.program is interpreter.program
+    assert bigger.run() == output
+
+
+def test_violations_keep_the_trace():
+    size = Interpreter(KILLED).size + 100
+    with pytest.raises(MemoryError, match="start > divbinx > ifel > ifel_true > kill$"):
+        Interpreter(KILLED, size=size, debug=True).run()
+    with pytest.raises(MemoryError, match="memory: start$"):
+        Interpreter(KILLED, size=size).run()
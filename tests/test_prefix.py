@@ -0,0 +1,41 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+import conftest
+
+# Prints before reading anything
+PROGRAM = conftest.PRINT + conftest.PROGRAM
+
+
+def straight(data: str, **options) -> tuple:
+    interpreter = Interpreter(PROGRAM, **options)
+    return interpreter.run(in_tape=data), interpreter.steps
+
+
+@pytest.mark.parametrize("options", [{}, {"debug": True}, {"optimize": False}])
+def test_prefix_resumes_like_a_straight_run(options):
+    artifact = Interpreter(PROGRAM).evaluate_prefix()
+    for data in ("7\n", "42\n"):
+        interpreter = Interpreter(PROGRAM, **options)
+        interpreter.load_prefix(artifact)
+        output = interpreter.run(in_tape=data)
+        assert output == "5\n" + data
+        if not options:
+            assert (output, interpreter.steps) == straight(data)
+
+
+def test_bounded_prefix():
+    interpreter = Interpreter(PROGRAM)
+    artifact = interpreter.evaluate_prefix(max_steps=10)
+    assert interpreter.steps == 10
+    interpreter = Interpreter(PROGRAM)
+    interpreter.load_prefix(artifact)
+    assert (interpreter.run(in_tape="42\n"), interpreter.steps) == straight("42\n")
+
+
+def test_prefix_needs_a_fresh_interpreter():
+    interpreter = Interpreter(PROGRAM)
+    interpreter.run(in_tape="42\n", max_steps=1)
+    with pytest.raises(IndexError):
+        interpreter.evaluate_prefix()
+    with pytest.raises(ValueError):
+        interpreter.load_prefix(b"BFSN")
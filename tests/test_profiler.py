@@ -0,0 +1,52 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+from BrainfuckProfiler import Profiler, macro_paths
+from conftest import PRINT
+
+
+@pytest.fixture(scope="module")
+def profiler() -> Profiler:
+    profiler = Profiler(Interpreter(PRINT, profile=True))
+    assert profiler.run() == "5\n"
+    return profiler
+
+
+def test_macro_paths(profiler):
+    interpreter = profiler.interpreter
+    paths = macro_paths(interpreter.program, interpreter.stack_trace_data)
+    assert paths[0] == ("start", "implant")
+    assert paths[-1] == ("start", "endl")
+    assert ("start", "printcleanintbinx", "divbinx") in paths
+
+
+def test_counts_add_up(profiler):
+    steps = profiler.interpreter.steps
+    stats = profiler.stats()
+    assert stats[("start",)].inclusive == steps
+    assert sum(entry.exclusive for entry in stats.values()) == steps
+    for path, entry in stats.items():
+        children = [stats[other] for other in stats if other[:-1] == path]
+        assert entry.inclusive == entry.exclusive + sum(c.inclusive for c in children)
+        assert entry.inclusive_loops == entry.loops + sum(c.inclusive_loops for c in children)
+    assert stats[("start", "endl")].inclusive == stats[("start", "endl")].exclusive > 0
+
+
+def test_collapsed_stacks(profiler):
+    lines = profiler.collapsed().split("\n")
+    assert sum(int(line.split(" ")[1]) for line in lines) == profiler.interpreter.steps
+    assert any(line.startswith("start;printcleanintbinx;divbinx ") for line in lines)
+
+
+def test_trace_events_nest(profiler):
+    events = profiler.trace_events()["traceEvents"]
+    spans = {tuple(e["args"]["path"].split(" > ")): (e["ts"], e["ts"] + e["dur"]) for e in events}
+    assert spans[("start",)] == (0, profiler.interpreter.steps)
+    for path, (start, end) in spans.items():
+        if len(path) > 1:
+            parent = spans[path[:-1]]
+            assert parent[0] <= start <= end <= parent[1]
+
+
+def test_needs_profile_mode():
+    with pytest.raises(ValueError):
+        Profiler(Interpreter(PRINT))
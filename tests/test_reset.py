@@ -0,0 +1,70 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+from conftest import PROGRAM
+
+
+@pytest.mark.parametrize("options", [{}, {"tiered": True}, {"optimize": False}])
+def test_reset_clears_what_the_run_wrote(options):
+    interpreter = Interpreter(PROGRAM, size=4096, **options)
+    tape = interpreter.mem
+    # Stopped halfway, with data on the tape
+    interpreter.run(in_tape="42\n", max_steps=20000)
+    assert 0 < len(tape.rstrip(b"\0")) <= interpreter.dirty <= interpreter.size
+    interpreter.reset()
+    assert interpreter.mem is tape and interpreter.dirty == 0
+    assert bytes(tape) == bytes(4096)
+    assert interpreter.run(in_tape="42\n") == "42\n"
+    interpreter.reset()
+    assert bytes(tape) == bytes(4096)
+    assert interpreter.run(in_tape="7\n") == "7\n"
+
+
+def test_offsets_past_the_pointer_are_cleared():
+    # The pointer never leaves cell 0, the writes are folded into offsets
+    interpreter = Interpreter(">>>>+<<<<", size=10)
+    interpreter.run()
+    assert interpreter.mem[4] == 1 and interpreter.dirty >= 5
+    interpreter.reset()
+    assert bytes(interpreter.mem) == bytes(10)
+
+
+def test_restore_marks_the_saved_cells():
+    interpreter = Interpreter(PROGRAM)
+    interpreter.run(in_tape="42\n", max_steps=5000)
+    snapshot = interpreter.snapshot()
+    interpreter.reset()
+    interpreter.restore(snapshot)
+    interpreter.reset()
+    assert bytes(interpreter.mem) == bytes(interpreter.size)
+
+
+def test_compiled_run_marks_the_whole_tape():
+    interpreter = Interpreter(PROGRAM)
+    interpreter.run_compiled(in_tape="42\n")
+    assert interpreter.dirty == interpreter.size
+    interpreter.reset()
+    assert bytes(interpreter.mem) == bytes(interpreter.size)
+
+
+def test_cache_limits(monkeypatch):
+    monkeypatch.setattr(Interpreter, "cache", dict())
+    monkeypatch.setattr(Interpreter, "CACHE_SIZE", 2)
+    for code in ("+", "++", "+++"):
+        Interpreter(code)
+    assert list(Interpreter.cache) == ["++", "+++"]
+    monkeypatch.setattr(Interpreter, "CACHE_CODE", 4)
+    Interpreter("++++")
+    assert list(Interpreter.cache) == ["++++"]
+    Interpreter.clear_cache()
+    assert not Interpreter.cache
+
+
+def test_failed_hot_loop_marks_its_writes(monkeypatch):
+    monkeypatch.setattr(Interpreter, "HOT_LOOP_THRESHOLD", 1)
+    # The compiled loop writes its way to the end of the tape and fails there
+    interpreter = Interpreter(",[>+]" + ">" * 60 + ".", size=100, tiered=True)
+    with pytest.raises(MemoryError):
+        interpreter.run(in_tape="a")
+    interpreter.reset()
+    assert bytes(interpreter.mem) == bytes(100)
+    assert interpreter.run(in_tape="\0") == "\0"
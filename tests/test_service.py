@@ -0,0 +1,75 @@
+import asyncio, os, signal, sys
+from BrainfuckService import Artifacts, Service
+from conftest import PROGRAM
+
+
+def handle(service: Service, *requests: dict) -> list[dict]:
+    async def main() -> list[dict]:
+        try:
+            return [await service.handle(request) for request in requests]
+        finally:
+            if service.pool is not None:
+                service.pool.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_runs_with_limits():
+    service = Service(processes=1)
+    fast, slow = handle(
+        service,
+        {"source": PROGRAM, "input": "42\n"},
+        {"source": "+[]", "max_steps": 1000},
+    )
+    assert fast["ok"] and fast["output"] == "42\n" and fast["error"] is None
+    assert slow["ok"] and slow["steps"] == 1000 and slow["error"].startswith("TimeoutError")
+
+
+def test_starts_outside_of_the_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Forked workers inherit a transpiler imported by another test
+    loaded = "VarfuckTranspiler" in sys.modules
+    service = Service(processes=1)
+    varfuck, macrofuck = handle(
+        service,
+        {"source": "x", "language": "varfuck"},
+        {"source": PROGRAM, "input": "7\n"},
+    )
+    # The transpiler cannot find its grammar here, which only fails its job
+    assert loaded or not varfuck["ok"]
+    assert macrofuck["ok"] and macrofuck["output"] == "7\n"
+
+
+def test_replaces_a_broken_pool():
+    service = Service(processes=1)
+
+    async def main() -> list[dict]:
+        try:
+            first = await service.handle({"source": PROGRAM, "input": "1\n"})
+            for process in list(service.pool._processes.values()):
+                os.kill(process.pid, signal.SIGKILL)
+                process.join()
+            responses = [first]
+            for _ in range(3):
+                responses.append(await service.handle({"source": PROGRAM, "input": "2\n"}))
+            return responses
+        finally:
+            service.pool.shutdown()
+
+    responses = asyncio.run(main())
+    assert responses[0]["output"] == "1\n"
+    assert responses[-1]["ok"] and responses[-1]["output"] == "2\n"
+
+
+def test_artifacts_keep_the_latest_codes(tmp_path, monkeypatch):
+    monkeypatch.setattr(Artifacts, "CODES", 2)
+    artifacts = Artifacts(str(tmp_path))
+    keys = [Artifacts.key("macrofuck", str(i)) for i in range(3)]
+    for key, code in zip(keys, "+-."):
+        artifacts.put(key, code)
+        artifacts.get(keys[0])
+    # The first one is used again after every put
+    assert list(artifacts.code) == [keys[2], keys[0]]
+    # Dropped codes are read back from the directory
+    assert artifacts.get(keys[1]) == "-" and len(artifacts) == 2
+    assert Artifacts().get(keys[1]) is None
@@ -0,0 +1,91 @@
+import pytest
+from BrainfuckInterpreter import Interpreter
+from BrainfuckDebugger import Debugger
+from conftest import PROGRAM
+
+PROGRAMS = [
+    (">>>+<<,", 10, "a"),
+    ("[--<+>]>>>-----<<,", 10, "a"),
+    (PROGRAM, None, "42\n"),
+]
+
+
+# Steps, output, pointer and tape of a run from the start
+def straight(code: str, size: int, in_tape: str) -> tuple:
+    interpreter = Interpreter(code, size=size)
+    output = interpreter.run(in_tape=in_tape)
+    return interpreter.steps, output, interpreter.pointer(), bytes(interpreter.mem)
+
+
+# Stops after some steps and resumes in another interpreter from a snapshot
+def resumed(code: str, size: int, in_tape: str, steps: int, **options) -> tuple:
+    interpreter = Interpreter(code, size=size)
+    output = interpreter.run(in_tape=in_tape, max_steps=steps)
+    other = Interpreter(code, size=size, **options)
+    other.restore(interpreter.snapshot())
+    if not other.finished():
+        output += other.run(in_tape=in_tape)
+    return other.steps, output, other.pointer(), bytes(other.mem)
+
+
+def stops(total: int) -> list[int]:
+    return sorted({0, 1, 2, 3, total - 1, total} | set(range(0, total, max(total // 50, 1))))
+
+
+@pytest.mark.parametrize("code, size, in_tape", PROGRAMS)
+def test_restore_resumes_like_a_straight_run(code, size, in_tape):
+    expected = straight(code, size, in_tape)
+    for steps in stops(expected[0]):
+        assert resumed(code, size, in_tape, steps) == expected
+
+
+@pytest.mark.parametrize("code, size, in_tape", PROGRAMS)
+def test_restore_under_other_options(code, size, in_tape):
+    # Step numbers follow the program that runs, the rest has to match
+    expected = straight(code, size, in_tape)[1:]
+    for steps in stops(straight(code, size, in_tape)[0])[::5]:
+        for options in ({"optimize": False}, {"profile": True}):
+            assert resumed(code, size, in_tape, steps, **options)[1:] == expected
+
+
+@pytest.mark.parametrize("code, size, in_tape", PROGRAMS)
+def test_lowering_again_keeps_the_instruction(code, size, in_tape):
+    expected = straight(code, size, in_tape)
+    for steps in stops(expected[0]):
+        interpreter = Interpreter(code, size=size)
+        output = interpreter.run(in_tape=in_tape, max_steps=steps)
+        interpreter.break_at(len(interpreter.code) - 1)
+        interpreter.clear_breakpoints()
+        if not interpreter.finished():
+            output += interpreter.run(in_tape=in_tape)
+        result = interpreter.steps, output, interpreter.pointer(), bytes(interpreter.mem)
+        assert result == expected
+
+
+def test_goto_matches_a_straight_run():
+    code, size, in_tape = PROGRAMS[1]
+    states = []
+    for steps in range(5):
+        interpreter = Interpreter(code, size=size)
+        interpreter.run(in_tape=in_tape, max_steps=steps)
+        states.append((interpreter.pc, interpreter.pointer(), bytes(interpreter.mem)))
+    interpreter = Interpreter(code, size=size)
+    debugger = Debugger(interpreter, in_tape, interval=1)
+    debugger.record()
+    for steps in (4, 2, 0, 3, 1, 4):
+        debugger.goto(steps)
+        assert interpreter.steps == steps
+        assert (interpreter.pc, interpreter.pointer(), bytes(interpreter.mem)) == states[steps]
+
+
+def test_snapshot_of_a_finished_program():
+    interpreter = Interpreter(">>>+<<,", size=10)
+    interpreter.run(in_tape="a")
+    other = Interpreter(">>>+<<,", size=10)
+    other.restore(interpreter.snapshot())
+    assert other.finished() and other.steps == 3 and other.pointer() == 1
+
+
+def test_snapshot_of_another_program():
+    with pytest.raises(ValueError):
+        Interpreter("+", size=4).restore(Interpreter("-", size=4).snapshot())
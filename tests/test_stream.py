@@ -0,0 +1,35 @@
+import io, sys, threading
+import pytest
+from BrainfuckInterpreter import Interpreter
+from BrainfuckIO import Sink, Source
+from conftest import PROGRAM
+
+
+def test_stream_yields_the_output():
+    chunks = Interpreter("implant(4;1)printcleanintbinx(4)endl()").stream()
+    assert b"".join(chunks) == b"1\n"
+
+
+def test_stopping_early_ends_the_worker():
+    before = set(threading.enumerate())
+    chunks = Interpreter("+[.]").stream(chunk_size=16)
+    assert next(chunks) == b"\x01" * 16
+    (worker,) = set(threading.enumerate()) - before
+    chunks.close()
+    worker.join(5)
+    assert not worker.is_alive()
+
+
+def test_io_bases_are_abstract():
+    for base in (Source, Sink):
+        with pytest.raises(TypeError):
+            base()
+
+
+def test_interactive_run_on_text_streams(monkeypatch):
+    # Like IDLE or notebook consoles: no binary buffer behind the streams
+    monkeypatch.setattr(sys, "stdin", io.StringIO("7\n"))
+    monkeypatch.setattr(sys, "stdout", io.StringIO())
+    code = PROGRAM + "+" * 233 + "."
+    assert Interpreter(code).run(True) == "7\n\xe9"
+    assert sys.stdout.getvalue() == "7\n\xe9"
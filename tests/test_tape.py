@@ -0,0 +1,62 @@
+import random
+import pytest
+from BrainfuckTape import PagedTape
+
+SIZE = 37  # Ends in a partial page
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(PagedTape, "PAGE_BITS", 3)
+
+
+# A paged tape and a bytearray with the same cells: a few scattered values,
+# a page of zeros that was written and pages that were never touched
+def tapes(seed: int) -> tuple[PagedTape, bytearray]:
+    generator = random.Random(seed)
+    paged, plain = PagedTape(SIZE), bytearray(SIZE)
+    for _ in range(generator.randrange(12)):
+        index = generator.randrange(SIZE)
+        paged[index] = plain[index] = generator.choice((1, 2, 255))
+    paged[8:16] = plain[8:16] = bytes(8)
+    return paged, plain
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_search_like_bytearray(seed):
+    paged, plain = tapes(seed)
+    assert paged[:] == bytes(plain)
+    for value in (0, 1, 2):
+        for start in range(SIZE + 2):
+            assert paged.find(value, start) == plain.find(value, start)
+            for end in range(start, SIZE + 2):
+                assert paged.rfind(value, start, end) == plain.rfind(value, start, end)
+
+
+def test_search_over_full_pages():
+    paged, plain = PagedTape(SIZE), bytearray(SIZE)
+    paged[0:24] = plain[0:24] = b"\1" * 24
+    for start in range(SIZE):
+        assert paged.find(0, start) == plain.find(0, start)
+        assert paged.rfind(0, 0, start) == plain.rfind(0, 0, start)
+    # The last page is partial: nothing past the size is found
+    paged[32:] = plain[32:] = b"\1" * 5
+    assert paged.find(0, 24) == plain.find(0, 24) == 24
+    assert paged.find(0, 32) == plain.find(0, 32) == -1
+
+
+def test_write_and_used():
+    paged = PagedTape(SIZE)
+    assert paged.used() == 0 and not paged.pages
+    # Zeros do not allocate pages
+    paged.write(3, bytes(20))
+    assert not paged.pages
+    paged.write(6, b"\1\0\0\2\0")
+    assert paged[:12] == bytes(6) + b"\1\0\0\2" + bytes(2)
+    assert sorted(paged.pages) == [0, 1] and paged.used() == 10
+    paged[36] = 7
+    assert paged.used() == SIZE and paged[-1] == 7
+    paged[36] = 0
+    assert paged.used() == 10
+    paged.clear()
+    assert paged.used() == 0 and paged[:] == bytes(SIZE)